@@ -1,13 +1,37 @@
 from flask import Flask, render_template, request, jsonify, send_file
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import re
 import html
-import markdown
-from playwright.sync_api import sync_playwright
-from pypdf import PdfWriter, PdfReader
 from datetime import datetime
 import os
+import json
+import contextvars
+import hashlib
+import importlib
+import math
+import tempfile
 import logging
+from browser_pool import RENDER_PARALLELISM, RenderCancelled, get_browser_pool, is_browser_failure
+from async_browser import cancel_on_disconnect
+from pdf_outline import build_outline_update, resolve_heading_pages
+from markdown_renderer import MarkdownBlockRenderer
+from image_preprocess import DataImageProcessor
+import metrics
+import time
+from pdf_cache import PdfCache, document_cache_key, CACHE_ENABLED
+from render_jobs import JobQueueFull, JobStore, ensure_job_runner, is_valid_job_id
+from render_admission import AdmissionControl, RenderQueueFull
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from simple_pdf import build_simple_pdf
+from document_intake import IntakeError, read_json_body, validate_document
+from pdf_batch import write_merged_pdf, write_zip
+import pdf_optimize
+from static_assets import Asset, StaticAssets
+from page_preview import (
+    FORMATS as PREVIEW_FORMATS, LAYOUT_SCRIPT, PREVIEW_MAX_PAGES, PREVIEW_SCALE, ThumbnailCache,
+    block_pages, content_box, data_url, encode_thumbnail, marker_attribute, page_count, page_key, thumbnail_format
+)
 
 # Configure logging
 logging.basicConfig(
@@ -15,11 +39,25 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-app = Flask(__name__)
+# static/ is served from memory by serve_static (hashed URLs, precompressed variants)
+app = Flask(__name__, static_folder=None)
 
 # Security configurations
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit
 
+# Rendered PDFs by content hash (memory per worker, disk shared by all workers)
+pdf_cache = PdfCache() if CACHE_ENABLED else None
+# Host-wide limit on concurrent Chromium renders, independent of the worker count
+render_admission = AdmissionControl()
+
+# Files of static/ in memory, with content-hashed URLs for templates
+static_assets = StaticAssets()
+app.jinja_env.globals['asset_url'] = static_assets.url
+
+# Markdown -> HTML fragments by block content hash
+markdown_renderer = MarkdownBlockRenderer()
+image_processor = DataImageProcessor()
+
 @app.after_request
 def add_security_headers(response):
     """Add security headers to all responses"""
@@ -75,398 +113,893 @@ def clean_heading_text(text):
     
     return cleaned
 
-def add_simple_bookmarks(pdf_buffer, document_data):
-    """Add hierarchical bookmarks to PDF - simple and reliable"""
+def outline_update(pdf_bytes, document_data, headings=None, heading_pages=None):
+    """Incremental update that adds hierarchical bookmarks - b'' on error
+
+    headings comes from build_document_body (collected again when omitted),
+    heading_pages maps heading id -> (page_index, top) as resolved from the
+    rendered PDF. A heading without a resolved page uses the previous one.
+    """
+    logger = logging.getLogger(__name__)
+    
     try:
-        # Read PDF
-        pdf_buffer.seek(0)
-        reader = PdfReader(pdf_buffer)
-        writer = PdfWriter()
+        if headings is None:
+            _, headings = build_document_body(document_data)
+        if heading_pages is None:
+            heading_pages, _ = resolve_heading_pages(pdf_bytes, headings)
         
-        # Copy all pages
-        for page in reader.pages:
-            writer.add_page(page)
+        # Hierarchical bookmarks (title = level 1, block titles = level 2, # = level 3, ...)
+        entries = []
+        page_index = 0
+        for heading in headings:
+            top = None
+            if heading['id'] in heading_pages:
+                page_index, top = heading_pages[heading['id']]
+            entries.append((heading['level'], heading['title'], page_index, top))
         
-        # Hierarchical bookmarks
-        parent_bookmarks = {}  # level -> bookmark_reference
+        if not entries:
+            return b''
         
-        # Main title as Level 1
-        if document_data.get('title'):
-            main_bookmark = writer.add_outline_item(document_data['title'], 0)
-            parent_bookmarks[1] = main_bookmark
-        
-        # Process all blocks
-        for block in document_data.get('blocks', []):
-            # Block title as Level 2
-            if block.get('title'):
-                title = block['title']
-                parent = parent_bookmarks.get(1)  # Under main title
-                block_bookmark = writer.add_outline_item(title, 0, parent=parent)
-                parent_bookmarks[2] = block_bookmark
-                
-                # Reset deeper levels
-                for level in list(parent_bookmarks.keys()):
-                    if level > 2:
-                        del parent_bookmarks[level]
-            
-            # Extract Markdown headings
-            if block.get('type') == 'markdown' and block.get('content'):
-                content = block['content']
-                lines = content.split('\n')
-                
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('#'):
-                        # Determine level
-                        level = 0
-                        for char in line:
-                            if char == '#':
-                                level += 1
-                            else:
-                                break
-                        
-                        # Extract and clean text
-                        text = line[level:].strip()
-                        if text:
-                            clean_text = text.replace('**', '').replace('*', '').replace('`', '')
-                            
-                            # Adjust level (# becomes Level 3, ## becomes Level 4, etc.)
-                            bookmark_level = level + 2
-                            
-                            # Find parent
-                            parent = None
-                            for parent_level in range(bookmark_level - 1, 0, -1):
-                                if parent_level in parent_bookmarks:
-                                    parent = parent_bookmarks[parent_level]
-                                    break
-                            
-                            # Add bookmark
-                            bookmark = writer.add_outline_item(clean_text, 0, parent=parent)
-                            parent_bookmarks[bookmark_level] = bookmark
-                            
-                            # Reset deeper levels
-                            for level_key in list(parent_bookmarks.keys()):
-                                if level_key > bookmark_level:
-                                    del parent_bookmarks[level_key]
-        
-        # Create PDF
-        output_buffer = BytesIO()
-        writer.write(output_buffer)
-        output_buffer.seek(0)
-        return output_buffer
+        return build_outline_update(pdf_bytes, entries)
         
     except Exception as e:
-        # Return original on error
-        pdf_buffer.seek(0)
-        return pdf_buffer
+        logger.warning(f"⚠️ Adding bookmarks failed: {str(e)}")
+        return b''
 
-def create_pdf_from_html(document_data):
-    """Create PDF directly from HTML/CSS - for Advanced Markdown Editor"""
-    import logging
-    import os
-    import tempfile
+def add_simple_bookmarks(pdf_buffer, document_data, headings=None, heading_pages=None):
+    """Add hierarchical bookmarks to PDF - appended as an incremental update"""
+    pdf_buffer.seek(0)
+    pdf_bytes = pdf_buffer.read()
     
-    # Setup production logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
+    # Append outline to the original file instead of rewriting all pages
+    output_buffer = BytesIO()
+    output_buffer.write(pdf_bytes)
+    output_buffer.write(outline_update(pdf_bytes, document_data, headings, heading_pages))
+    output_buffer.seek(0)
+    return output_buffer
+
+def spool_file():
+    """Anonymous temp file for a rendered PDF - streamed to the client from disk"""
+    return tempfile.TemporaryFile(prefix='gpttopdf-')
+
+def file_size(fileobj):
+    """Size of a file object, leaving it positioned at the start"""
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+# Stylesheet of the generated PDF (A4 print layout)
+PDF_STYLESHEET = """
+    @page {
+        size: A4;
+        margin: 0.5cm 2cm 2cm 2cm;
+    }
+
+    body {
+        font-family: 'Segoe UI', Arial, sans-serif;
+        font-size: 9pt;
+        line-height: 1.6;
+        color: #333;
+        margin: 0;
+        padding: 20px;
+        background: white;
+    }
+
+    /* Headings in blue */
+    h1, h2, h3, h4, h5, h6 {
+        color: #1e3a8a !important;
+        margin-top: 1.5rem;
+        margin-bottom: 1rem;
+    }
+
+    h1 {
+        border-bottom: 2px solid #ddd;
+        padding-bottom: 0.5rem;
+    }
+
+    h2, h3 {
+        border-bottom: 1px solid #eee;
+        padding-bottom: 0.3rem;
+    }
+
+    /* Blockquotes */
+    blockquote {
+        border-left: 4px solid #007bff;
+        margin: 1rem 0;
+        padding: 0.5rem 1rem;
+        background-color: #f8f9fa;
+        font-style: italic;
+        color: #6c757d;
+    }
+
+    /* Tables */
+    table {
+        width: 100%;
+        border-collapse: collapse;
+        margin: 1rem 0;
+        font-size: 0.7rem;
+    }
+
+    table th, table td {
+        border: 1px solid #ddd;
+        padding: 8px 12px;
+        text-align: left;
+    }
+
+    table th {
+        background-color: #f8f9fa;
+        font-weight: bold;
+        color: #495057;
+    }
+
+    table tr:nth-child(even) {
+        background-color: #f8f9fa;
+    }
+
+    /* Code */
+    pre {
+        background: #f8f9fa;
+        border: 1px solid #e9ecef;
+        border-radius: 4px;
+        padding: 1rem;
+        overflow-x: auto;
+        font-family: 'Courier New', monospace;
+        font-size: 0.9rem;
+    }
+
+    code {
+        background: #f8f9fa;
+        padding: 0.2rem 0.4rem;
+        border-radius: 3px;
+        font-family: 'Courier New', monospace;
+        font-size: 0.9rem;
+        color: #e83e8c;
+    }
+
+    pre code {
+        background: none;
+        padding: 0;
+        color: inherit;
+    }
+
+    /* Lists */
+    ul, ol {
+        margin: 1rem 0;
+        padding-left: 2rem;
+    }
+
+    li {
+        margin: 0.5rem 0;
+    }
+
+    /* Paragraphs */
+    p {
+        margin-bottom: 1rem;
+        text-align: justify;
+    }
+
+    /* Images never wider than the page */
+    img {
+        max-width: 100%;
+        height: auto;
+    }
+
+    /* Markdown Content Container */
+    .markdown-content {
+        margin-bottom: 20px;
+    }
+"""
+
+# Playwright page.pdf() options
+PDF_OPTIONS = {
+    'format': 'A4',
+    'margin': {
+        'top': '0.5cm',
+        'right': '2cm',
+        'bottom': '2cm',
+        'left': '2cm'
+    },
+    'print_background': True,
+    'prefer_css_page_size': True,
+    'outline': True,  # Chromium's outline tells us the page of every heading
+    'tagged': True,
+    'display_header_footer': False
+}
+
+# Theme variants on top of the base stylesheet - selected with document_data['theme']
+PDF_THEMES = {
+    'default': '',
+    'compact': """
+    body {
+        font-size: 8pt;
+        line-height: 1.4;
+        padding: 10px;
+    }
+
+    h1, h2, h3, h4, h5, h6 {
+        margin-top: 1rem;
+        margin-bottom: 0.5rem;
+    }
+
+    p, ul, ol {
+        margin-bottom: 0.6rem;
+    }
+""",
+    'print': """
+    /* Ink saving: black headings, no background fills */
+    h1, h2, h3, h4, h5, h6 {
+        color: #000 !important;
+    }
+
+    blockquote, pre, code, table th, table tr:nth-child(even) {
+        background: none !important;
+    }
+
+    code {
+        color: inherit;
+    }
+""",
+}
+DEFAULT_THEME = 'default'
+
+class PdfTemplate:
+    """Base document of a theme (head, @page rules, stylesheet) - compiled once per process"""
     
-    logger.info(f"🚀 Starting PDF generation for: {document_data.get('title', 'Untitled')}")
+    def __init__(self, name, stylesheet):
+        self.name = name
+        self.head_html = f"""
+    <!DOCTYPE html>
+    <html lang="de" data-pdf-template="{name}">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <style>{stylesheet}</style>
+    </head>
+    <body>
+        """
+        self.tail_html = """
+    </body>
+    </html>
+    """
+        self.shell_html = self.head_html + self.tail_html
+        self.version = hashlib.sha256(self.shell_html.encode('utf-8')).hexdigest()[:16]
     
-    try:
-        # Build HTML content for Markdown
-        content_html = ""
+    def document(self, content_html):
+        """Full HTML document for the given body content"""
+        return self.head_html + content_html + self.tail_html
+
+PDF_TEMPLATES = {
+    name: PdfTemplate(name, PDF_STYLESHEET + theme_css)
+    for name, theme_css in PDF_THEMES.items()
+}
+
+def get_template(document_data):
+    """Template for the document's theme"""
+    return PDF_TEMPLATES.get(document_data.get('theme') or DEFAULT_THEME, PDF_TEMPLATES[DEFAULT_THEME])
+
+# Sharded rendering of large documents (shards render concurrently on the browser pool)
+SHARD_THRESHOLD_BLOCKS = int(os.environ.get('PDF_SHARD_THRESHOLD_BLOCKS', '80'))
+SHARD_THRESHOLD_BYTES = int(os.environ.get('PDF_SHARD_THRESHOLD_KB', '1024')) * 1024
+SHARD_MAX_COUNT = int(os.environ.get('PDF_SHARD_MAX_COUNT', '4'))
+
+# Batch conversion (/batch) - documents render concurrently on the browser pool
+BATCH_MAX_DOCUMENTS = int(os.environ.get('PDF_BATCH_MAX_DOCUMENTS', '50'))
+BATCH_MAX_BYTES = int(os.environ.get('PDF_BATCH_MAX_MB', '50')) * 1024 * 1024
+BATCH_PARALLELISM = int(os.environ.get('PDF_BATCH_PARALLELISM', str(RENDER_PARALLELISM)))
+
+# Hermetic rendering: no network access, finish on an explicit ready signal instead of networkidle
+HERMETIC_RENDER = os.environ.get('PDF_HERMETIC_RENDER', '1') == '1'
+# Warm pages keep a template loaded, renders only replace the body (needs hermetic rendering)
+WARM_TEMPLATES = HERMETIC_RENDER and os.environ.get('PDF_WARM_TEMPLATES', '1') == '1'
+READY_TIMEOUT_MS = int(os.environ.get('PDF_READY_TIMEOUT_MS', '10000'))
+# Bundled assets (static/) are reachable from the rendered HTML under this origin only
+ASSET_ORIGIN = 'https://assets.gpttopdf.local/'
+
+# Fonts loaded, images settled (blocked ones fail fast) and two frames laid out
+READY_SCRIPT = """
+() => {
+    window.__pdfReady = false;
+    const images = Array.from(document.images)
+        .filter(img => !img.complete)
+        .map(img => new Promise(resolve => { img.onload = img.onerror = resolve; }));
+    Promise.all([document.fonts.ready, ...images])
+        .then(() => new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve))))
+        .then(() => { window.__pdfReady = true; });
+}
+"""
+
+# Swap the body of a warm page - false if the page no longer holds the template
+INJECT_SCRIPT = """
+([name, html]) => {
+    if (document.documentElement.dataset.pdfTemplate !== name) return false;
+    document.body.innerHTML = html;
+    return true;
+}
+"""
+
+# Changes whenever the rendered output would change - part of every cache key
+RENDERER_VERSION = hashlib.sha256(
+    (
+        ''.join(template.version for template in PDF_TEMPLATES.values())
+        + json.dumps(PDF_OPTIONS, sort_keys=True)
+        + f'hermetic={HERMETIC_RENDER}'
+        + json.dumps(pdf_optimize.settings(), sort_keys=True)
+        + json.dumps(image_processor.settings(), sort_keys=True)
+    ).encode('utf-8')
+).hexdigest()[:16]
+
+def build_document_body(document_data, start=0, end=None, block_marker=None):
+    """Build the body content for the PDF renderer - returns (content_html, headings)
+
+    headings lists every heading in document order as dicts with id, level
+    (1 = document title, 2 = block title, 3+ = Markdown headings), title
+    and block index - the single source for the PDF outline.
+
+    start/end select a slice of the blocks (for sharded rendering); heading
+    ids stay the same as in the full document. block_marker (an attribute
+    name) adds an empty <div block_marker="index"> before every block, for
+    the preview layout.
+    """
+    started = time.perf_counter()
+    markdown_seconds = 0.0
+    
+    # Build HTML content for Markdown
+    content_html = ""
+    headings = []
+
+    # Add title (only the first shard carries it)
+    if document_data.get('title') and start == 0:
+        title = html.escape(document_data['title'])
+        # Unique ID for bookmark navigation
+        content_html += f'<h1 id="title-bookmark" style="color: #1e3a8a; text-align: center; margin-bottom: 30px; border-bottom: 2px solid #ddd; padding-bottom: 10px;">{title}</h1>\n'
+        headings.append({'id': 'title-bookmark', 'level': 1, 'title': document_data['title'], 'block': None})
+
+    # Process blocks - for Markdown blocks
+    block_counter = 0
+    for index, block in enumerate(document_data.get('blocks', [])):
+        if end is not None and index >= end:
+            break
         
-        # Add title
-        if document_data.get('title'):
-            title = html.escape(document_data['title'])
-            # Unique ID for bookmark navigation
-            content_html += f'<h1 id="title-bookmark" style="color: #1e3a8a; text-align: center; margin-bottom: 30px; border-bottom: 2px solid #ddd; padding-bottom: 10px;">{title}</h1>\n'
+        block_type = block.get('type', 'markdown')
+        block_content = block.get('content', '')
+        block_title = block.get('title', '')
+
+        if not block_content.strip() and not block_title.strip():
+            continue
+
+        block_counter += 1
         
-        # Process blocks - for Markdown blocks
-        block_counter = 0
-        for block in document_data.get('blocks', []):
-            block_type = block.get('type', 'markdown')
-            block_content = block.get('content', '')
-            block_title = block.get('title', '')
-            
-            if not block_content.strip() and not block_title.strip():
-                continue
-            
-            block_counter += 1
-            
-            # Add block title if present
-            if block_title.strip():
-                escaped_title = html.escape(block_title)
-                # H2 for better structure - real HTML tag for Playwright
-                content_html += f'<h2 id="block-{block_counter}" style="color: #1e3a8a; margin-top: 25px; margin-bottom: 15px; border-bottom: 1px solid #eee; padding-bottom: 5px;">{escaped_title}</h2>\n'
-            
-            # Process block content by type
-            if block_type == 'markdown':
-                # Convert Markdown to HTML server-side for correct headings
-                if block_content.strip():
-                    # Convert Markdown to HTML
-                    md = markdown.Markdown(extensions=[
-                        'tables', 
-                        'fenced_code'
-                    ])
-                    html_content = md.convert(block_content)
-                    
-                    # Manually add IDs to headings for bookmarks
-                    import re
-                    def add_heading_ids(match):
-                        level = len(match.group(1))
-                        text = match.group(2)
-                        # Generate simple ID from text
-                        heading_id = re.sub(r'[^a-zA-Z0-9]', '-', text.lower()).strip('-')
-                        return f'<h{level} id="heading-{block_counter}-{heading_id}">{text}</h{level}>'
-                    
-                    # Regex for <h1>text</h1> to <h6>text</h6>
-                    html_content = re.sub(r'<h([1-6])>([^<]+)</h[1-6]>', add_heading_ids, html_content)
-                    
-                    content_html += f'{html_content}\n'
-            elif block_type == 'code':
-                escaped_content = html.escape(block_content)
-                content_html += f'<pre style="background: #f5f5f5; padding: 15px; border: 1px solid #ddd; border-radius: 4px; font-family: \'Courier New\', monospace; font-size: 13px; line-height: 1.4; overflow-x: auto; margin: 15px 0;"><code>{escaped_content}</code></pre>\n'
+        if index < start:
+            continue
         
-        # Create HTML template (for Markdown with marked.js)
-        full_html = f"""
-        <!DOCTYPE html>
-        <html lang="de">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                @page {{
-                    size: A4;
-                    margin: 0.5cm 2cm 2cm 2cm;
-                }}
-                
-                body {{
-                    font-family: 'Segoe UI', Arial, sans-serif;
-                    font-size: 9pt;
-                    line-height: 1.6;
-                    color: #333;
-                    margin: 0;
-                    padding: 20px;
-                    background: white;
-                }}
-                
-                /* Headings in blue */
-                h1, h2, h3, h4, h5, h6 {{
-                    color: #1e3a8a !important;
-                    margin-top: 1.5rem;
-                    margin-bottom: 1rem;
-                }}
-                
-                h1 {{
-                    border-bottom: 2px solid #ddd;
-                    padding-bottom: 0.5rem;
-                }}
-                
-                h2, h3 {{
-                    border-bottom: 1px solid #eee;
-                    padding-bottom: 0.3rem;
-                }}
-                
-                /* Blockquotes */
-                blockquote {{
-                    border-left: 4px solid #007bff;
-                    margin: 1rem 0;
-                    padding: 0.5rem 1rem;
-                    background-color: #f8f9fa;
-                    font-style: italic;
-                    color: #6c757d;
-                }}
-                
-                /* Tables */
-                table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 1rem 0;
-                    font-size: 0.7rem;
-                }}
-                
-                table th, table td {{
-                    border: 1px solid #ddd;
-                    padding: 8px 12px;
-                    text-align: left;
-                }}
-                
-                table th {{
-                    background-color: #f8f9fa;
-                    font-weight: bold;
-                    color: #495057;
-                }}
-                
-                table tr:nth-child(even) {{
-                    background-color: #f8f9fa;
-                }}
-                
-                /* Code */
-                pre {{
-                    background: #f8f9fa;
-                    border: 1px solid #e9ecef;
-                    border-radius: 4px;
-                    padding: 1rem;
-                    overflow-x: auto;
-                    font-family: 'Courier New', monospace;
-                    font-size: 0.9rem;
-                }}
-                
-                code {{
-                    background: #f8f9fa;
-                    padding: 0.2rem 0.4rem;
-                    border-radius: 3px;
-                    font-family: 'Courier New', monospace;
-                    font-size: 0.9rem;
-                    color: #e83e8c;
-                }}
-                
-                pre code {{
-                    background: none;
-                    padding: 0;
-                    color: inherit;
-                }}
-                
-                /* Lists */
-                ul, ol {{
-                    margin: 1rem 0;
-                    padding-left: 2rem;
-                }}
-                
-                li {{
-                    margin: 0.5rem 0;
-                }}
-                
-                /* Paragraphs */
-                p {{
-                    margin-bottom: 1rem;
-                    text-align: justify;
-                }}
+        if block_marker:
+            # Empty block box - margins collapse through it, the layout is unchanged
+            content_html += f'<div {block_marker}="{index}"></div>\n'
+
+        # Add block title if present
+        if block_title.strip():
+            escaped_title = html.escape(block_title)
+            # H2 for better structure - real HTML tag for Playwright
+            content_html += f'<h2 id="block-{block_counter}" style="color: #1e3a8a; margin-top: 25px; margin-bottom: 15px; border-bottom: 1px solid #eee; padding-bottom: 5px;">{escaped_title}</h2>\n'
+            headings.append({'id': f'block-{block_counter}', 'level': 2, 'title': block_title, 'block': index})
+
+        # Process block content by type
+        if block_type == 'markdown':
+            # Convert Markdown to HTML server-side for correct headings (memoized per block)
+            if block_content.strip():
+                markdown_started = time.perf_counter()
+                html_content, block_headings = markdown_renderer.render(block_content, block_counter)
+                markdown_seconds += time.perf_counter() - markdown_started
+                # Pasted images at print resolution (memoized by image hash)
+                if 'data:image/' in html_content:
+                    with metrics.timer('images'):
+                        html_content = image_processor.process(html_content)
+                for heading_id, level, text in block_headings:
+                    headings.append({'id': heading_id, 'level': level + 2, 'title': text, 'block': index})
                 
-                /* Markdown Content Container */
-                .markdown-content {{
-                    margin-bottom: 20px;
-                }}
-            </style>
-        </head>
-        <body>
-            {content_html}
-        </body>
-        </html>
-        """
-        
-        # Generate PDF with Playwright (like a real browser)
-        logger.info("🌐 Launching browser for PDF generation...")
-        
-        with sync_playwright() as p:
-            # Enhanced browser launch for Docker/Linux
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor',
-                    '--run-all-compositor-stages-before-draw',
-                    '--disable-background-timer-throttling',
-                    '--disable-renderer-backgrounding',
-                    '--disable-backgrounding-occluded-windows',
-                    '--disable-ipc-flooding-protection'
-                ]
-            )
-            
-            page = browser.new_page()
-            
-            # Load HTML and generate PDF
+                content_html += f'{html_content}\n'
+        elif block_type == 'code':
+            escaped_content = html.escape(block_content)
+            content_html += f'<pre style="background: #f5f5f5; padding: 15px; border: 1px solid #ddd; border-radius: 4px; font-family: \'Courier New\', monospace; font-size: 13px; line-height: 1.4; overflow-x: auto; margin: 15px 0;"><code>{escaped_content}</code></pre>\n'
+    
+    metrics.observe_stage('markdown', markdown_seconds)
+    metrics.observe_stage('html_assembly', time.perf_counter() - started - markdown_seconds)
+    return content_html, headings
+
+def route_hermetic_request(route):
+    """Serve bundled assets from memory, block every other request of the rendered page"""
+    url = route.request.url
+    if url.startswith(ASSET_ORIGIN):
+        asset, _ = static_assets.lookup(url[len(ASSET_ORIGIN):].split('?', 1)[0])
+        if asset is not None:
+            route.fulfill(body=asset.variants['identity'], content_type=asset.mimetype)
+            return
+    route.abort()
+
+def load_html(page, full_html):
+    """Load an HTML document into a fresh page and wait until it is laid out"""
+    if HERMETIC_RENDER:
+        page.route('**/*', route_hermetic_request)
+        with metrics.timer('set_content'):
+            page.set_content(full_html, wait_until='domcontentloaded')
+        with metrics.timer('wait_for_ready'):
+            page.evaluate(READY_SCRIPT)
+            page.wait_for_function('() => window.__pdfReady === true', polling='raf', timeout=READY_TIMEOUT_MS)
+    else:
+        with metrics.timer('set_content'):
             page.set_content(full_html)
+        with metrics.timer('wait_for_load_state'):
             page.wait_for_load_state('networkidle', timeout=30000)
-            
-            pdf_bytes = page.pdf(
-                format='A4',
-                margin={
-                    'top': '0.5cm',
-                    'right': '2cm', 
-                    'bottom': '2cm',
-                    'left': '2cm'
-                },
-                print_background=True,
-                prefer_css_page_size=True,
-                outline=False,
-                display_header_footer=False
-            )
-            
-            logger.info(f"✅ PDF generated successfully ({len(pdf_bytes)} bytes)")
-            
-            if len(pdf_bytes) == 0:
-                raise Exception("PDF generation resulted in empty file")
-            
-            pdf_buffer = BytesIO()
-            pdf_buffer.write(pdf_bytes)
-            pdf_buffer.seek(0)
-            
-            browser.close()
+
+def render_html_to_pdf(full_html, run=None):
+    """Render an HTML document to PDF bytes on a warm pooled browser
+
+    run replaces the pool's run function (a slot reserved for a shard).
+    """
+    def render_page(page):
+        # Load HTML and generate PDF
+        load_html(page, full_html)
+        with metrics.timer('page_pdf'):
+            return page.pdf(**PDF_OPTIONS)
+    
+    pdf_bytes = (run or get_browser_pool().run)(render_page)
+    
+    if len(pdf_bytes) == 0:
+        raise Exception("PDF generation resulted in empty file")
+    
+    return pdf_bytes
+
+def prepare_template_page(page, template):
+    """Load a template into a fresh warm page"""
+    page.route('**/*', route_hermetic_request)
+    page.set_content(template.shell_html)
+
+def inject_body(page, content_html, template):
+    """Replace the body of a warm template page and wait until it is laid out"""
+    # Stylesheet and fonts are already parsed
+    with metrics.timer('set_content'):
+        if not page.evaluate(INJECT_SCRIPT, [template.name, content_html]):
+            # The last body navigated the page away (e.g. a meta refresh) - load the template again
+            prepare_template_page(page, template)
+            page.evaluate(INJECT_SCRIPT, [template.name, content_html])
+    with metrics.timer('wait_for_ready'):
+        page.evaluate(READY_SCRIPT)
+        page.wait_for_function('() => window.__pdfReady === true', polling='raf', timeout=READY_TIMEOUT_MS)
+
+def render_body_to_pdf(content_html, template, run=None):
+    """Render body content with a template - on a warm page that already has it loaded
+
+    Warm pages run without JavaScript, so a document's HTML cannot leave
+    anything behind for the next one; the body is emptied after the render.
+    """
+    if not WARM_TEMPLATES:
+        return render_html_to_pdf(template.document(content_html), run)
+    
+    def render_page(page):
+        inject_body(page, content_html, template)
+        with metrics.timer('page_pdf'):
+            pdf_bytes = page.pdf(**PDF_OPTIONS)
+        page.evaluate('() => { document.body.innerHTML = ""; }')
+        return pdf_bytes
+    
+    pdf_bytes = (run or get_browser_pool().run)(
+        render_page,
+        warm_key=template.version,
+        warm_setup=lambda page: prepare_template_page(page, template)
+    )
+    
+    if len(pdf_bytes) == 0:
+        raise Exception("PDF generation resulted in empty file")
+    
+    return pdf_bytes
+
+def plan_shards(blocks):
+    """Split blocks into (start, end) ranges of similar size - one range means no sharding"""
+    # Shards one after another would only add page setup, a merge and page breaks
+    shard_count = min(SHARD_MAX_COUNT, RENDER_PARALLELISM, len(blocks))
+    if shard_count < 2:
+        return [(0, len(blocks))]
+    
+    sizes = [len(block.get('content', '')) + len(block.get('title', '')) for block in blocks]
+    total_size = sum(sizes)
+    if len(blocks) < SHARD_THRESHOLD_BLOCKS and total_size < SHARD_THRESHOLD_BYTES:
+        return [(0, len(blocks))]
+    
+    target = total_size / shard_count
+    
+    shards = []
+    start = 0
+    accumulated = 0
+    for index, size in enumerate(sizes):
+        accumulated += size
+        remaining_shards = shard_count - len(shards) - 1
+        remaining_blocks = len(blocks) - index - 1
+        # Cut at a block boundary once the shard is full (but leave a block for every remaining shard)
+        if remaining_shards > 0 and remaining_blocks >= remaining_shards and accumulated >= target * (len(shards) + 1):
+            shards.append((start, index + 1))
+            start = index + 1
+    shards.append((start, len(blocks)))
+    return shards
+
+def render_sharded_pdf(document_data, shards, runners):
+    """Render block ranges concurrently and merge them - returns (pdf_bytes, headings, heading_pages, total_pages)
+
+    runners holds one reserved pool slot (run function) per shard.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"🧩 Rendering {len(document_data.get('blocks', []))} blocks in {len(shards)} shards...")
+    
+    def render_shard(shard, run):
+        start, end = shard
+        content_html, headings = build_document_body(document_data, start, end)
+        shard_bytes = render_body_to_pdf(content_html, get_template(document_data), run)
+        heading_pages, shard_page_count = resolve_heading_pages(shard_bytes, headings)
+        return shard_bytes, headings, heading_pages, shard_page_count
+    
+    # Shards inherit the request's context (client disconnect check of the async engine)
+    contexts = [contextvars.copy_context() for _ in shards]
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        shard_results = list(executor.map(
+            lambda context, shard, run: context.run(render_shard, shard, run), contexts, shards, runners
+        ))
+    
+    from pypdf import PdfReader, PdfWriter
+    
+    writer = PdfWriter()
+    headings = []
+    heading_pages = {}
+    for shard_bytes, shard_headings, shard_pages, _ in shard_results:
+        page_offset = len(writer.pages)
+        headings.extend(shard_headings)
+        for heading_id, (page_index, top) in shard_pages.items():
+            heading_pages[heading_id] = (page_index + page_offset, top)
+        # Shard outlines are replaced by the document outline
+        writer.append(PdfReader(BytesIO(shard_bytes)), import_outline=False)
+    
+    output_buffer = BytesIO()
+    writer.write(output_buffer)
+    return output_buffer.getvalue(), headings, heading_pages, len(writer.pages)
+
+def render_pdf_document(document_data, optimize=True):
+    """Render a document to a bookmarked PDF - raises on failure
+
+    optimize=False skips the size optimization and linearization (faster,
+    larger file) even where PDF_OPTIMIZE / PDF_LINEARIZE turn them on.
+    """
+    logger = logging.getLogger(__name__)
+    
+    # Generate PDF with Playwright (like a real browser) on warm pooled browsers
+    shards = plan_shards(document_data.get('blocks', []))
+    sharded = False
+    if len(shards) > 1:
+        # A render slot and a pool slot per shard (the caller's slot covers the first),
+        # all at once or no sharding - shards never wait for each other's slots
+        with render_admission.extra_slots(len(shards) - 1) as admitted:
+            if admitted:
+                with get_browser_pool().reserve(len(shards)) as runners:
+                    if runners:
+                        pdf_bytes, headings, heading_pages, total_pages = render_sharded_pdf(document_data, shards, runners)
+                        sharded = True
+    if not sharded:
+        logger.info("🌐 Rendering PDF on pooled browser...")
+        content_html, headings = build_document_body(document_data)
+        pdf_bytes = render_body_to_pdf(content_html, get_template(document_data))
+        heading_pages = None
+    
+    logger.info(f"✅ PDF generated successfully ({len(pdf_bytes)} bytes)")
+    
+    if optimize and pdf_optimize.OPTIMIZE:
+        pdf_bytes, _ = pdf_optimize.optimize_pdf(pdf_bytes)
+    
+    # Spool to disk right away - the only full copy in memory is Chromium's output
+    pdf_file = spool_file()
+    try:
+        pdf_file.write(pdf_bytes)
         
         # Add simple bookmarks
         logger.info("🔖 Adding bookmarks...")
-        pdf_buffer = add_simple_bookmarks(pdf_buffer, document_data)
-        logger.info("✅ PDF generation completed successfully")
+        with metrics.timer('bookmarks'):
+            if heading_pages is None:
+                heading_pages, total_pages = resolve_heading_pages(pdf_bytes, headings)
+            pdf_file.write(outline_update(pdf_bytes, document_data, headings, heading_pages))
+        
+        # Last step - the outline update above would break a linearized file
+        if optimize and pdf_optimize.LINEARIZE:
+            linearized = spool_file()
+            if pdf_optimize.linearize_file(pdf_file, linearized):
+                pdf_file.close()
+                pdf_file = linearized
+            else:
+                linearized.close()
+            pdf_file.seek(0, os.SEEK_END)
+    except BaseException:
+        pdf_file.close()
+        raise
+    logger.info("✅ PDF generation completed successfully")
+    
+    metrics.inc('gpttopdf_output_bytes_total', pdf_file.tell())
+    metrics.inc('gpttopdf_output_pages_total', total_pages)
+    pdf_file.seek(0)
+    return pdf_file
+
+def create_fallback_pdf(error, document_data=None):
+    """Render the document without a browser - plain text layout, built in milliseconds"""
+    logger = logging.getLogger(__name__)
+    
+    metrics.inc('gpttopdf_renders_total', source='fallback')
+    
+    try:
+        logger.info("🔄 Creating fallback PDF...")
+        if document_data is None:
+            document_data = {
+                'title': 'PDF Generation Error',
+                'blocks': [{'type': 'markdown', 'content': f'Error: {str(error)}\n\nTime: {datetime.now()}'}]
+            }
         
-        return pdf_buffer
+        with metrics.timer('fallback'):
+            pdf_bytes, entries = build_simple_pdf(
+                document_data,
+                notice='Vereinfachte Darstellung - der PDF-Renderer ist gerade nicht verfügbar.'
+            )
+            if entries:
+                pdf_bytes += build_outline_update(pdf_bytes, entries)
         
+        return BytesIO(pdf_bytes)
+            
+    except Exception as fallback_error:
+        logger.error(f"❌ Fallback PDF creation failed: {str(fallback_error)}")
+        metrics.inc('gpttopdf_errors_total', stage='fallback')
+        # Return minimal PDF
+        buffer = BytesIO()
+        buffer.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        buffer.seek(0)
+        return buffer
+
+def probe_renderer():
+    """Recovery probe of the circuit breaker - a tiny render on the pool"""
+    def render_probe(page):
+        page.set_content('<p>probe</p>')
+        return page.pdf(format='A4')
+    
+    with render_admission.slot(block=True):
+        if len(get_browser_pool().run(render_probe)) == 0:
+            raise Exception("Probe resulted in empty PDF")
+
+# Opens after repeated Chromium failures - requests then get the browser-free fallback
+render_breaker = CircuitBreaker('chromium', probe_renderer)
+
+# Worker pre-warm (gunicorn post_fork): browsers launched and the default template
+# loaded before the worker accepts its first request
+WORKER_PREWARM = os.environ.get('WORKER_PREWARM', '1') == '1'
+# Below gunicorn's worker timeout - post_fork blocks until the worker is warm
+PREWARM_TIMEOUT = float(os.environ.get('WORKER_PREWARM_TIMEOUT', '20'))
+# Imported on first use; with preload_app the master imports them once for all workers
+HEAVY_MODULES = ('pypdf', 'pypdf.generic', 'markdown', 'PIL.Image')
+# pending -> warming -> warm | failed; disabled without pre-warm
+worker_state = {'prewarm': 'pending' if WORKER_PREWARM else 'disabled'}
+# States /healthz/ready reports ready in - a failed pre-warm keeps the worker out of rotation
+PREWARM_READY = ('warm', 'disabled')
+
+def import_heavy_modules():
+    """Import the lazily imported libraries now (missing optional ones are skipped)"""
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+def prewarm_worker():
+    """Launch this worker's browsers and load the default template - renders no PDF"""
+    logger = logging.getLogger(__name__)
+    worker_state['prewarm'] = 'warming'
+    started = time.perf_counter()
+    try:
+        import_heavy_modules()
+        pool = get_browser_pool()
+        template = PDF_TEMPLATES[DEFAULT_THEME]
+        options = {}
+        if WARM_TEMPLATES:
+            options = {
+                'warm_key': template.version,
+                'warm_setup': lambda page: prepare_template_page(page, template)
+            }
+        # Every slot of the sync pool gets its browser (and warm page) - concurrent runs occupy one slot each
+        browsers = pool.size if pool.stats()['engine'] == 'sync' else 1
+        with ThreadPoolExecutor(max_workers=browsers) as executor:
+            futures = [
+                executor.submit(pool.run, lambda page: None, timeout=PREWARM_TIMEOUT, **options)
+                for _ in range(browsers)
+            ]
+            for future in futures:
+                future.result()
+    except Exception as e:
+        worker_state['prewarm'] = 'failed'
+        logger.error(f"❌ Worker {os.getpid()} pre-warm failed: {str(e)}")
+        if is_browser_failure(e):
+            render_breaker.record_failure(e)
+        return False
+
+    elapsed = time.perf_counter() - started
+    worker_state['prewarm'] = 'warm'
+    metrics.observe_stage('worker_prewarm', elapsed)
+    logger.info(f"🔥 Worker {os.getpid()} warm in {elapsed:.2f}s")
+    return True
+
+def render_with_breaker(document_data, optimize=True):
+    """render_pdf_document, reporting the outcome to the circuit breaker"""
+    if not render_breaker.allow():
+        raise CircuitOpen("Chromium renderer is unavailable (circuit open)")
+    try:
+        pdf_buffer = render_pdf_document(document_data, optimize)
+    except Exception as e:
+        # Document errors, ready timeouts, a busy pool or a client that left
+        # say nothing about Chromium's health
+        if is_browser_failure(e):
+            render_breaker.record_failure(e)
+        raise
+    render_breaker.record_success()
+    return pdf_buffer
+
+def create_pdf_from_html(document_data):
+    """Create PDF directly from HTML/CSS - for Advanced Markdown Editor
+
+    The caller holds a render slot (render_admission.slot()).
+    """
+    logger = logging.getLogger(__name__)
+    
+    logger.info(f"🚀 Starting PDF generation for: {document_data.get('title', 'Untitled')}")
+    
+    try:
+        return render_with_breaker(document_data)
+    except CircuitOpen as e:
+        return create_fallback_pdf(e, document_data)
+    except RenderCancelled:
+        raise
     except Exception as e:
         logger.error(f"❌ PDF generation failed: {str(e)}")
-        
-        # Create a simple fallback PDF with error message
+        metrics.inc('gpttopdf_errors_total', stage='render')
+        return create_fallback_pdf(e, document_data)
+
+def get_or_render_pdf(document_data, cache_key=None, fallback=True, block=False, optimize=True):
+    """Return (pdf_file, cache_key) - served from the cache when possible.
+
+    cache_key is None when the result must not be cached (fallback PDF).
+    With fallback=False render errors are raised instead. Renders need a
+    host-wide render slot: raises RenderQueueFull unless block=True.
+    optimize=False skips the optimize stage; a cached (optimized) PDF is
+    still served, but the unoptimized result is not cached.
+    """
+    logger = logging.getLogger(__name__)
+    
+    if pdf_cache is not None:
+        if cache_key is None:
+            cache_key = document_cache_key(document_data, RENDERER_VERSION)
+        pdf_bytes = pdf_cache.get(cache_key)
+        if pdf_bytes is not None:
+            logger.info(f"⚡ PDF cache hit ({len(pdf_bytes)} bytes)")
+            metrics.inc('gpttopdf_renders_total', source='cache')
+            return BytesIO(pdf_bytes), cache_key
+    
+    logger.info(f"🚀 Starting PDF generation for: {document_data.get('title', 'Untitled')}")
+    
+    # Chromium is switched off - no render slot needed for the browser-free fallback
+    if not render_breaker.allow():
+        if not fallback:
+            raise CircuitOpen("Chromium renderer is unavailable (circuit open)")
+        logger.warning("🔌 Circuit open - serving browser-free fallback PDF")
+        return create_fallback_pdf(None, document_data), None
+    
+    with render_admission.slot(block=block):
         try:
-            logger.info("🔄 Creating fallback PDF...")
-            with sync_playwright() as p:
-                browser = p.chromium.launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox']
-                )
-                page = browser.new_page()
-                
-                error_html = f"""
-                <!DOCTYPE html>
-                <html>
-                <head><title>PDF Generation Error</title></head>
-                <body>
-                    <h1>PDF Generation Error</h1>
-                    <p>Error: {str(e)}</p>
-                    <p>Time: {datetime.now()}</p>
-                </body>
-                </html>
-                """
-                
-                page.set_content(error_html)
-                pdf_bytes = page.pdf(format='A4')
-                browser.close()
-                
-                buffer = BytesIO()
-                buffer.write(pdf_bytes)
-                buffer.seek(0)
-                return buffer
-                
-        except Exception as fallback_error:
-            logger.error(f"❌ Fallback PDF creation failed: {str(fallback_error)}")
-            # Return minimal PDF
-            buffer = BytesIO()
-            buffer.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
-            buffer.seek(0)
-            return buffer
+            pdf_buffer = render_with_breaker(document_data, optimize)
+        except RenderCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"❌ PDF generation failed: {str(e)}")
+            metrics.inc('gpttopdf_errors_total', stage='render')
+            if not fallback:
+                raise
+            return create_fallback_pdf(e, document_data), None
+    
+    metrics.inc('gpttopdf_renders_total', source='render')
+    if not optimize and pdf_optimize.POST_PROCESS:
+        return pdf_buffer, None
+    if cache_key is not None:
+        pdf_cache.put_file(cache_key, pdf_buffer, file_size(pdf_buffer))
+    
+    return pdf_buffer, cache_key
+
+def pdf_filename(document_data):
+    """Derive a safe download filename from the document title"""
+    title = document_data.get('title', '').strip()
+    if not title:
+        title = 'Dokument ohne Namen'
+    safe_title = re.sub(r'[^\w\s-]', '', title).strip()
+    safe_title = re.sub(r'[-\s]+', '_', safe_title)
+    return f"{safe_title or 'document'}.pdf"
+
+def read_document_request(client_ip):
+    """Parse and validate a document_data JSON body - returns (document_data, error_response)"""
+    with metrics.timer('parse'):
+        return _read_document_request(client_ip)
+
+def _read_document_request(client_ip):
+    logger = logging.getLogger(__name__)
+    
+    # Content-Type validation
+    if not request.is_json:
+        logger.warning(f"Invalid content-type from {client_ip}")
+        return None, (jsonify({'error': 'Content-Type must be application/json'}), 400)
+    
+    # Size limit enforced while reading (prevent DoS)
+    try:
+        document_data, content_size = read_json_body(request.stream, request.content_length)
+    except IntakeError as e:
+        logger.warning(f"Rejected request from {client_ip}: {e.message}")
+        return None, (jsonify({'error': e.message}), e.status)
+    
+    # Validate structure
+    error = validate_document(document_data, PDF_TEMPLATES)
+    if error:
+        logger.warning(f"Invalid document from {client_ip}: {error}")
+        return None, (jsonify({'error': error}), 400)
+    
+    logger.info(f"PDF generation request from {client_ip}, size: {content_size} bytes")
+    return document_data, None
+
+def run_render_job(job):
+    """Render one queued job ('document' or 'batch', payload) - called on the job runner's threads"""
+    kind, payload = job
+    if kind == 'batch':
+        return run_batch_job(*payload)
+    # The job was queued already - wait for a render slot instead of rejecting
+    pdf_file, cache_key = get_or_render_pdf(payload, fallback=False, block=True)
+    return {'pdf_file': pdf_file, 'size': file_size(pdf_file)}
+
+def render_editor_page():
+    """The editor page, rendered without a request (it only depends on the static files)"""
+    with app.test_request_context('/'):
+        return Asset(render_template('index.html').encode('utf-8'), 'text/html')
+
+# Rendered once per process - with preload_app in the master, shared by all workers
+editor_page = render_editor_page()
+
+def asset_response(asset, cache_control):
+    """Smallest accepted variant of an in-memory asset - 304 if the client has it"""
+    encoding = asset.choose(request.accept_encodings)
+    etag = asset.etag(encoding)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    if len(asset.variants) > 1:
+        response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/')
 def index():
     """Main page of the application"""
-    return render_template('index.html')
+    # Template edits show up without a restart in the development server
+    page = render_editor_page() if app.debug else editor_page
+    return asset_response(page, 'no-cache')
+
+@app.route('/static/<path:filename>')
+def serve_static(filename):
+    """Static file by plain or content-hashed name"""
+    asset, cache_control = static_assets.lookup(filename)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return asset_response(asset, cache_control)
 
 @app.route('/favicon.ico')
 def favicon():
     """Favicon route"""
-    return send_file('static/favicon.ico', mimetype='image/vnd.microsoft.icon')
+    return serve_static('favicon.ico')
 
 @app.route('/debug/test-pdf')
 def debug_test_pdf():
@@ -484,7 +1017,8 @@ def debug_test_pdf():
             ]
         }
         
-        pdf_buffer = create_pdf_from_html(test_data)
+        with render_admission.slot(), cancel_on_disconnect(request.environ):
+            pdf_buffer = create_pdf_from_html(test_data)
         
         return send_file(
             pdf_buffer,
@@ -492,6 +1026,8 @@ def debug_test_pdf():
             download_name="health_check.pdf",
             mimetype='application/pdf'
         )
+    except RenderQueueFull as e:
+        return render_queue_full_response(e)
     except Exception as e:
         return jsonify({
             'error': str(e), 
@@ -499,6 +1035,74 @@ def debug_test_pdf():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/healthz/live')
+def healthz_live():
+    """Liveness - the worker answers, nothing else is checked"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@app.route('/healthz/ready')
+def healthz_ready():
+    """Readiness - warm, renderer available and render queue not full; renders nothing"""
+    queue = render_admission.stats()
+    renderer = render_breaker.stats()
+    reasons = []
+    if worker_state['prewarm'] in ('pending', 'warming'):
+        reasons.append('worker is warming up')
+    elif worker_state['prewarm'] not in PREWARM_READY:
+        reasons.append(f"worker pre-warm {worker_state['prewarm']}")
+    if not render_breaker.allow():
+        reasons.append('renderer unavailable (circuit open)')
+    if queue['queue_limit'] and queue['waiting'] >= queue['queue_limit']:
+        reasons.append('render queue full')
+    
+    response = jsonify({
+        'status': 'not ready' if reasons else 'ready',
+        'reasons': reasons,
+        'pid': os.getpid(),
+        'prewarm': worker_state['prewarm'],
+        'renderer': renderer['state'],
+        'warm_browsers': get_browser_pool().stats()['warm'],
+        'render_queue': {'running': queue['running'], 'waiting': queue['waiting'], 'limit': queue['queue_limit']}
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 503 if reasons else 200
+
+@app.route('/debug/cache-stats')
+def debug_cache_stats():
+    """Hit rates of this worker's caches"""
+    return jsonify({
+        'pid': os.getpid(),
+        'pdf_cache': pdf_cache.stats() if pdf_cache is not None else None,
+        'markdown_cache': markdown_renderer.stats(),
+        'image_cache': image_processor.stats(),
+        'static_assets': static_assets.stats()
+    })
+
+@app.route('/circuit-breaker')
+def circuit_breaker_state():
+    """State of this worker's Chromium circuit breaker"""
+    return jsonify({'pid': os.getpid(), **render_breaker.stats()})
+
+@app.route('/debug/render-queue')
+def debug_render_queue():
+    """Host-wide render slots and wait queue"""
+    return jsonify(render_admission.stats())
+
+def render_queue_full_response(error):
+    """429 with Retry-After and the current wait queue depth"""
+    response = jsonify({
+        'error': str(error),
+        'queue_depth': error.queue_depth,
+        'queue_limit': render_admission.queue_limit
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of all workers' metrics"""
+    return app.response_class(metrics.render_exposition(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/create_pdf', methods=['POST'])
 def create_pdf():
     """Modern PDF generation for Advanced Markdown Editor"""
@@ -506,54 +1110,326 @@ def create_pdf():
     client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
     
     try:
-        # Content-Type validation
-        if not request.is_json:
-            logger.warning(f"Invalid content-type from {client_ip}")
-            return jsonify({'error': 'Content-Type must be application/json'}), 400
-        
-        document_data = request.json
+        document_data, error_response = read_document_request(client_ip)
+        if error_response:
+            return error_response
         
-        # Input validation
-        if not document_data:
-            logger.warning(f"Empty request from {client_ip}")
-            return jsonify({'error': 'No data provided'}), 400
+        # Repeat export of an unchanged document - client already has this PDF
+        cache_key = None
+        if pdf_cache is not None:
+            cache_key = document_cache_key(document_data, RENDERER_VERSION)
+            if request.if_none_match.contains(cache_key):
+                logger.info(f"PDF not modified for {client_ip}")
+                response = app.response_class(status=304)
+                response.set_etag(cache_key)
+                return response
         
-        # Size validation (prevent DoS)
-        content_size = len(str(document_data))
-        if content_size > 10 * 1024 * 1024:  # 10MB limit
-            logger.warning(f"Oversized request ({content_size} bytes) from {client_ip}")
-            return jsonify({'error': 'Content too large (max 10MB)'}), 413
+        # ?optimize=0 - latency over size: skip the optimize stage
+        optimize = request.args.get('optimize', '1') != '0'
         
-        # Validate structure
-        if not isinstance(document_data, dict):
-            logger.warning(f"Invalid data format from {client_ip}")
-            return jsonify({'error': 'Invalid data format'}), 400
-        
-        logger.info(f"PDF generation request from {client_ip}, size: {content_size} bytes")
-        
-        pdf_buffer = create_pdf_from_html(document_data)
+        try:
+            with cancel_on_disconnect(request.environ):
+                pdf_buffer, cache_key = get_or_render_pdf(document_data, cache_key, optimize=optimize)
+        except RenderQueueFull as e:
+            logger.warning(f"PDF request rejected for {client_ip}: {str(e)}")
+            return render_queue_full_response(e)
+        except RenderCancelled:
+            # Nobody is listening - nginx' "client closed request"
+            logger.info(f"PDF render cancelled, {client_ip} disconnected")
+            return app.response_class(status=499)
         
-        # Derive filename from title
-        title = document_data.get('title', '').strip()
-        if not title:
-            title = 'Dokument ohne Namen'
-        safe_title = re.sub(r'[^\w\s-]', '', title).strip()
-        safe_title = re.sub(r'[-\s]+', '_', safe_title)
-        filename = f"{safe_title or 'document'}.pdf"
+        filename = pdf_filename(document_data)
         
         logger.info(f"PDF generated successfully for {client_ip}: {filename}")
         
-        return send_file(
+        # Streamed in chunks from the spooled file (or the cached bytes)
+        size = file_size(pdf_buffer)
+        response = send_file(
             pdf_buffer,
             as_attachment=True,
             download_name=filename,
-            mimetype='application/pdf'
+            mimetype='application/pdf',
+            etag=False
         )
+        response.content_length = size
+        if cache_key is not None:
+            response.set_etag(cache_key)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        
+        send_started = time.perf_counter()
+        response.call_on_close(lambda: metrics.observe_stage('response_send', time.perf_counter() - send_started))
+        return response
     except Exception as e:
         logger.error(f"PDF generation failed for {client_ip}: {str(e)}")
+        metrics.inc('gpttopdf_errors_total', stage='request')
         return jsonify({'error': 'PDF generation failed'}), 500
 
+def render_batch_document(index, document_data):
+    """Render one document of a batch - errors are returned, not raised"""
+    logger = logging.getLogger(__name__)
+    error = validate_document(document_data, PDF_TEMPLATES)
+    named = document_data if not error else {}
+    result = {
+        'index': index,
+        'title': named.get('title') or f'Dokument {index + 1}',
+        'filename': pdf_filename(named),
+    }
+    if error:
+        result['error'] = error
+        return result
+    
+    try:
+        # The batch is a queued job - documents wait for render slots
+        result['file'], _ = get_or_render_pdf(document_data, fallback=False, block=True)
+    except Exception as e:
+        logger.warning(f"Batch document {index} failed: {str(e)}")
+        result['error'] = str(e)
+    return result
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """Queue many documents as one job - its result is a ZIP (default) or one merged PDF (?format=pdf)"""
+    logger = logging.getLogger(__name__)
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    
+    output_format = request.args.get('format', 'zip')
+    if output_format not in ('zip', 'pdf'):
+        return jsonify({'error': "format must be 'zip' or 'pdf'"}), 400
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+    
+    try:
+        with metrics.timer('parse'):
+            payload, content_size = read_json_body(request.stream, request.content_length, BATCH_MAX_BYTES)
+    except IntakeError as e:
+        logger.warning(f"Rejected batch from {client_ip}: {e.message}")
+        return jsonify({'error': e.message}), e.status
+    
+    documents = payload.get('documents') if isinstance(payload, dict) else payload
+    if not isinstance(documents, list) or not documents:
+        return jsonify({'error': "Expected a non-empty list of documents (or {'documents': [...]})"}), 400
+    if len(documents) > BATCH_MAX_DOCUMENTS:
+        return jsonify({'error': f'Too many documents (max {BATCH_MAX_DOCUMENTS})'}), 413
+    
+    logger.info(f"Batch of {len(documents)} documents from {client_ip} ({content_size} bytes, {output_format})")
+    # Rendered as a job - a batch takes longer than a sync worker may block (gunicorn timeout)
+    return submit_job(
+        client_ip,
+        ('batch', (documents, output_format)),
+        filename=f'batch.{output_format}',
+        mimetype='application/pdf' if output_format == 'pdf' else 'application/zip',
+        documents=len(documents)
+    )
+
+def run_batch_job(documents, output_format):
+    """Render and package a batch on a job thread - returns the job result"""
+    logger = logging.getLogger(__name__)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_PARALLELISM, len(documents)))) as executor:
+        results = list(executor.map(render_batch_document, range(len(documents)), documents))
+    
+    output = spool_file()
+    try:
+        with metrics.timer('batch_package'):
+            if output_format == 'pdf':
+                report = write_merged_pdf(results, output)
+            else:
+                report = write_zip(results, output)
+    except Exception:
+        output.close()
+        metrics.inc('gpttopdf_errors_total', stage='batch')
+        raise
+    finally:
+        for result in results:
+            if result.get('file') is not None:
+                result['file'].close()
+    
+    failed = sum(1 for entry in report if entry['status'] == 'failed')
+    logger.info(f"Batch done in {time.perf_counter() - started:.2f}s ({failed} of {len(results)} failed)")
+    return {'pdf_file': output, 'size': file_size(output), 'failed_documents': failed}
+
+# Page thumbnails of /preview, by page content (per worker)
+thumbnail_cache = ThumbnailCache()
+
+def set_preview_media(page):
+    """Preview layout: print media, one content box wide"""
+    page_width, page_height = content_box()
+    page.set_viewport_size({'width': math.ceil(page_width), 'height': math.ceil(page_height)})
+    page.emulate_media(media='print')
+
+def prepare_preview_page(page, template):
+    """Warm preview page: template loaded, print media, one content box wide"""
+    set_preview_media(page)
+    prepare_template_page(page, template)
+
+def parse_preview_pages(value):
+    """'all' or a comma-separated list of 1-based page numbers - None if invalid"""
+    if value == 'all':
+        return list(range(1, PREVIEW_MAX_PAGES + 1))
+    try:
+        pages = sorted({int(part) for part in value.split(',') if part.strip()})
+    except ValueError:
+        return None
+    if not pages or pages[0] < 1:
+        return None
+    return pages[:PREVIEW_MAX_PAGES]
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """Low-resolution page thumbnails, page count and block page breaks - for the editor"""
+    logger = logging.getLogger(__name__)
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    
+    requested_format = request.args.get('format', 'png')
+    if requested_format not in PREVIEW_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(PREVIEW_FORMATS)}"}), 400
+    pages = parse_preview_pages(request.args.get('pages', '1'))
+    if pages is None:
+        return jsonify({'error': "pages must be 'all' or a list of page numbers like 1,2"}), 400
+    
+    document_data, error_response = read_document_request(client_ip)
+    if error_response:
+        return error_response
+    
+    if not render_breaker.allow():
+        return jsonify({'error': 'Preview is unavailable right now'}), 503
+    
+    image_format = thumbnail_format(requested_format)
+    template = get_template(document_data)
+    # Per-request marker - block HTML cannot fake or shadow the markers
+    block_marker = marker_attribute()
+    content_html, _ = build_document_body(document_data, block_marker=block_marker)
+    page_width, page_height = content_box()
+    
+    def render_preview(page):
+        if WARM_TEMPLATES:
+            inject_body(page, content_html, template)
+        else:
+            set_preview_media(page)
+            load_html(page, template.document(content_html))
+        layout = page.evaluate(LAYOUT_SCRIPT, block_marker)
+        count = page_count(layout, page_height)
+        
+        thumbnails = []
+        for number in pages:
+            if number > count:
+                break
+            key = page_key(document_data, layout, page_height, number, template.version, image_format)
+            image = thumbnail_cache.get(key)
+            cached = image is not None
+            if image is None:
+                # Only pages whose blocks changed are captured again
+                with metrics.timer('preview_capture'):
+                    png_bytes = page.screenshot(
+                        type='png',
+                        full_page=True,
+                        clip={'x': 0, 'y': (number - 1) * page_height, 'width': page_width, 'height': page_height}
+                    )
+                    image = encode_thumbnail(png_bytes, image_format)
+                thumbnail_cache.put(key, image)
+            thumbnails.append({'page': number, 'cached': cached, 'image': data_url(image, image_format)})
+        
+        if WARM_TEMPLATES:
+            page.evaluate('() => { document.body.innerHTML = ""; }')
+        return layout, count, thumbnails
+    
+    warm_options = {}
+    if WARM_TEMPLATES:
+        warm_options = {
+            'warm_key': f'preview-{template.version}',
+            'warm_setup': lambda page: prepare_preview_page(page, template)
+        }
+    try:
+        with render_admission.slot():
+            layout, count, thumbnails = get_browser_pool().run(
+                render_preview,
+                context_options={'device_scale_factor': PREVIEW_SCALE},
+                **warm_options
+            )
+    except RenderQueueFull as e:
+        logger.warning(f"Preview rejected for {client_ip}: {str(e)}")
+        return render_queue_full_response(e)
+    except Exception as e:
+        logger.error(f"Preview failed for {client_ip}: {str(e)}")
+        metrics.inc('gpttopdf_errors_total', stage='preview')
+        return jsonify({'error': 'Preview failed'}), 500
+    
+    return jsonify({
+        'page_count': count,
+        'format': image_format,
+        'blocks': block_pages(document_data, layout, page_height),
+        'thumbnails': thumbnails
+    })
+
+def submit_job(client_ip, job, **meta):
+    """Queue a job for the job runner process - 202 with its URLs, or 429"""
+    logger = logging.getLogger(__name__)
+    store = JobStore()
+    try:
+        status = store.enqueue(client_ip, job, priority=request.args.get('priority', 'normal'), **meta)
+    except JobQueueFull as e:
+        logger.warning(f"Job rejected for {client_ip}: {str(e)}")
+        response = jsonify({'error': str(e), 'queue_depth': store.queue_depth()})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    ensure_job_runner(store)
+    
+    logger.info(f"Job {status['job_id']} queued for {client_ip} (position {status['queue_position']})")
+    
+    response = jsonify({
+        'job_id': status['job_id'],
+        'status': status['status'],
+        'queue_position': status['queue_position'],
+        'status_url': f"/jobs/{status['job_id']}",
+        'pdf_url': f"/jobs/{status['job_id']}/pdf"
+    })
+    response.headers['Location'] = f"/jobs/{status['job_id']}"
+    return response, 202
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a PDF render job - poll /jobs/<id> and download /jobs/<id>/pdf"""
+    logger = logging.getLogger(__name__)
+    client_ip = request.environ.get('HTTP_X_REAL_IP', request.remote_addr)
+    
+    try:
+        document_data, error_response = read_document_request(client_ip)
+        if error_response:
+            return error_response
+        
+        return submit_job(client_ip, ('document', document_data), filename=pdf_filename(document_data))
+    except Exception as e:
+        logger.error(f"Job submission failed for {client_ip}: {str(e)}")
+        return jsonify({'error': 'Job submission failed'}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a render job"""
+    job = JobStore().get(job_id) if is_valid_job_id(job_id) else None
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/pdf')
+def job_pdf(job_id):
+    """Download the result of a finished render job"""
+    store = JobStore()
+    job = store.get(job_id) if is_valid_job_id(job_id) else None
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    
+    return send_file(
+        store.result_path(job_id),
+        as_attachment=True,
+        download_name=job.get('filename', 'document.pdf'),
+        mimetype=job.get('mimetype', 'application/pdf')
+    )
+
 if __name__ == '__main__':
     # This should only be used for local development
     # In production, use Gunicorn via Docker
+    # Browsers start on the first request here - the reloader would launch them twice
+    worker_state['prewarm'] = 'disabled'
     app.run(debug=True, host='0.0.0.0', port=5000)
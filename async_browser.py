@@ -0,0 +1,357 @@
+"""Async render engine - many pages of one browser on one event loop per worker.
+
+The sync engine (browser_pool.BrowserPool) renders one page per browser at
+a time. This engine runs Playwright's async API on an event loop thread of
+its own and drives up to ASYNC_MAX_PAGES pages of a single browser at once,
+so a worker with gthread request threads renders concurrently without a
+browser per render.
+
+Render functions stay synchronous: they get a SyncPage that forwards every
+page call to the loop and waits for it in the request thread. While it
+waits, the render deadline (RENDER_TIMEOUT) and the client connection are
+checked; on timeout or disconnect the pending call is cancelled and the page
+is thrown away.
+"""
+import asyncio
+import contextvars
+import inspect
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import metrics
+from browser_pool import (
+    ACQUIRE_TIMEOUT, ASYNC_MAX_PAGES, CHROMIUM_ARGS, MAX_RENDERS_PER_BROWSER,
+    BrowserPoolTimeout, RenderCancelled
+)
+
+logger = logging.getLogger(__name__)
+
+RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', '60'))
+# How often a waiting request thread looks at its deadline and client socket
+POLL_INTERVAL = 0.25
+
+# Set per request by cancel_on_disconnect - returns True once the client is gone
+_cancel_check = contextvars.ContextVar('render_cancel_check', default=None)
+
+
+def _peer_closed(sock):
+    """True if the client closed its end of the connection"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        # Readable with nothing to read means EOF; pipelined request data is left in place
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+@contextmanager
+def cancel_on_disconnect(environ):
+    """Cancel renders of this request if its client disconnects (needs gunicorn.socket)"""
+    sock = environ.get('gunicorn.socket')
+    if sock is None:
+        yield
+        return
+    token = _cancel_check.set(lambda: _peer_closed(sock))
+    try:
+        yield
+    finally:
+        _cancel_check.reset(token)
+
+
+class RenderTimeout(Exception):
+    """A render did not finish within RENDER_TIMEOUT"""
+
+
+class _Lease:
+    """A page (in a context of its own) handed to one render"""
+
+    def __init__(self, page, browser, warm_key=None, fresh=True):
+        self.page = page
+        self.browser = browser
+        self.warm_key = warm_key
+        self.fresh = fresh
+
+
+class _DeferredRoute:
+    """Route for sync handlers on the loop - async calls are collected and awaited afterwards"""
+
+    def __init__(self, route, pending):
+        self._route = route
+        self._pending = pending
+
+    def __getattr__(self, name):
+        attr = getattr(self._route, name)
+        if inspect.iscoroutinefunction(attr):
+            return lambda *args, **kwargs: self._pending.append(attr(*args, **kwargs))
+        return attr
+
+
+class SyncPage:
+    """Blocking facade over an async Playwright page, used from a request thread"""
+
+    def __init__(self, engine, page, deadline, cancelled):
+        self._engine = engine
+        self._page = page
+        self._deadline = deadline
+        self._cancelled = cancelled
+
+    def route(self, url, handler):
+        async def async_handler(route, request=None):
+            pending = []
+            handler(_DeferredRoute(route, pending))
+            for call in pending:
+                await call
+        return self._engine.wait(self._page.route(url, async_handler), self._deadline, self._cancelled)
+
+    def __getattr__(self, name):
+        attr = getattr(self._page, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._engine.wait(attr(*args, **kwargs), self._deadline, self._cancelled)
+        return call
+
+
+class AsyncBrowserEngine:
+    """One browser, up to max_pages concurrent pages, on this worker's event loop"""
+
+    def __init__(self, max_pages=ASYNC_MAX_PAGES, max_renders=MAX_RENDERS_PER_BROWSER,
+                 acquire_timeout=ACQUIRE_TIMEOUT, launch_args=None):
+        self.pid = os.getpid()
+        self.max_pages = max(1, max_pages)
+        self.max_renders = max_renders
+        self.acquire_timeout = acquire_timeout
+        self.launch_args = launch_args or CHROMIUM_ARGS
+        self.launches = 0
+        self.total_renders = 0
+        self.cancelled = 0
+        self.timeouts = 0
+        self._pages = threading.BoundedSemaphore(self.max_pages)
+        self._in_use = 0
+        self._count_lock = threading.Lock()
+        # Loop state - only touched on the loop thread
+        self._playwright = None
+        self._browser = None
+        self._renders = 0  # on the current browser
+        self._active = {}  # browser -> renders in progress
+        self._warm_pages = {}  # warm_key -> idle pages with the template loaded
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='render-loop', daemon=True)
+        self._thread.start()
+
+    @property
+    def size(self):
+        return self.max_pages
+
+    def wait(self, coroutine, deadline, cancelled=None):
+        """Run coroutine on the loop and wait for it - cancelled on timeout or disconnect"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                return future.result(timeout=max(0.0, min(POLL_INTERVAL, remaining)))
+            except FutureTimeout:
+                pass
+            if remaining <= 0:
+                error = RenderTimeout("Render deadline exceeded")
+            elif cancelled is not None and cancelled():
+                error = RenderCancelled("Client disconnected")
+            else:
+                continue
+            if not future.cancel() and future.done():
+                # Finished in the meantime - its result must not be lost (page leases)
+                return future.result()
+            raise error
+
+    def run(self, fn, timeout=None, context_options=None, warm_key=None, warm_setup=None):
+        """Run fn(page) like BrowserPool.run - page calls are forwarded to the event loop"""
+        requested = time.perf_counter()
+        if not self._pages.acquire(timeout=self.acquire_timeout):
+            raise BrowserPoolTimeout(f"No page available after {self.acquire_timeout}s")
+        try:
+            return self._run_reserved(fn, timeout, context_options, warm_key, warm_setup, requested)
+        finally:
+            self._pages.release()
+
+    def _run_reserved(self, fn, timeout=None, context_options=None, warm_key=None, warm_setup=None, requested=None):
+        """run() on a page slot the caller already holds"""
+        requested = requested or time.perf_counter()
+        deadline = time.monotonic() + (timeout or RENDER_TIMEOUT)
+        cancelled = _cancel_check.get()
+        with self._count_lock:
+            self._in_use += 1
+        try:
+            return self._run_leased(fn, deadline, cancelled, requested, context_options, warm_key, warm_setup)
+        except RenderTimeout:
+            with self._count_lock:
+                self.timeouts += 1
+            raise
+        except RenderCancelled:
+            with self._count_lock:
+                self.cancelled += 1
+            raise
+        finally:
+            with self._count_lock:
+                self._in_use -= 1
+
+    @contextmanager
+    def reserve(self, count):
+        """Take count page slots at once, or none - like BrowserPool.reserve"""
+        taken = 0
+        while taken < count and self._pages.acquire(blocking=False):
+            taken += 1
+        if taken < count:
+            for _ in range(taken):
+                self._pages.release()
+            taken = 0
+        try:
+            yield [self._run_reserved] * taken
+        finally:
+            for _ in range(taken):
+                self._pages.release()
+
+    def _run_leased(self, fn, deadline, cancelled, requested, context_options, warm_key, warm_setup):
+        lease = self.wait(self._acquire(context_options, warm_key), deadline, cancelled)
+        metrics.observe_stage('browser_acquire', time.perf_counter() - requested)
+        try:
+            page = SyncPage(self, lease.page, deadline, cancelled)
+            if lease.fresh and warm_setup is not None:
+                warm_setup(page)
+            result = fn(page)
+        except BaseException:
+            # A failed or interrupted page never serves a second render
+            asyncio.run_coroutine_threadsafe(self._release(lease, broken=True), self._loop)
+            raise
+        asyncio.run_coroutine_threadsafe(self._release(lease, broken=False), self._loop)
+        return result
+
+    async def _ensure_browser(self):
+        if self._browser is not None and not self._browser.is_connected():
+            logger.warning("💥 Browser disconnected - replacing it")
+            await self._retire()
+
+        if self._browser is None:
+            if self._playwright is None:
+                from playwright.async_api import async_playwright
+                self._playwright = await async_playwright().start()
+            logger.info(f"🌐 Launching browser for the async engine ({self.max_pages} page(s))...")
+            started = time.perf_counter()
+            self._browser = await self._playwright.chromium.launch(headless=True, args=self.launch_args)
+            metrics.observe_stage('browser_launch', time.perf_counter() - started)
+            self._active[self._browser] = 0
+            self._renders = 0
+            self.launches += 1
+        return self._browser
+
+    async def _acquire(self, context_options, warm_key=None):
+        browser = await self._ensure_browser()
+        self._active[browser] += 1
+        context = None
+        try:
+            if warm_key is not None:
+                idle = self._warm_pages.get(warm_key, [])
+                while idle:
+                    page = idle.pop()
+                    if not page.is_closed():
+                        return _Lease(page, browser, warm_key, fresh=False)
+                # Warm pages outlive a render - scripts of one document must not run on into the next
+                context = await browser.new_context(**{**(context_options or {}), 'java_script_enabled': False})
+            else:
+                # Fresh isolated context per render - no cookies, storage or scripts outlive a request
+                context = await browser.new_context(**(context_options or {}))
+            return _Lease(await context.new_page(), browser, warm_key)
+        except BaseException:
+            # Cancelled or timed out between new_context and new_page - the context would leak
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            self._active[browser] -= 1
+            await self._close_if_drained(browser)
+            raise
+
+    async def _release(self, lease, broken):
+        self._active[lease.browser] -= 1
+        self.total_renders += 1
+        if lease.warm_key is not None and not broken and lease.browser is self._browser:
+            self._warm_pages.setdefault(lease.warm_key, []).append(lease.page)
+        else:
+            await self._close_context(lease.page)
+
+        if lease.browser is self._browser:
+            self._renders += 1
+            if self._renders >= self.max_renders:
+                logger.info(f"♻️ Recycling async browser after {self._renders} renders")
+                await self._retire()
+        await self._close_if_drained(lease.browser)
+
+    async def _close_context(self, page):
+        try:
+            await page.context.close()
+        except Exception:
+            pass
+
+    async def _retire(self):
+        """Stop handing out the current browser - it closes once its renders are done"""
+        browser, self._browser = self._browser, None
+        for pages in self._warm_pages.values():
+            for page in pages:
+                await self._close_context(page)
+        self._warm_pages = {}
+        if browser is not None:
+            await self._close_if_drained(browser)
+
+    async def _close_if_drained(self, browser):
+        if browser is self._browser or self._active.get(browser, 0) > 0:
+            return
+        self._active.pop(browser, None)
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    async def _shutdown(self):
+        await self._retire()
+        for browser in list(self._active):
+            self._active[browser] = 0
+            await self._close_if_drained(browser)
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    def recycle(self):
+        """Replace the browser - renders in progress finish on the old one"""
+        asyncio.run_coroutine_threadsafe(self._retire(), self._loop)
+
+    def stats(self):
+        with self._count_lock:
+            in_use = self._in_use
+        return {
+            'engine': 'async',
+            'size': self.max_pages,
+            'idle': self.max_pages - in_use,
+            'warm': int(self._browser is not None),
+            'launches': self.launches,
+            'renders': self.total_renders,
+            'cancelled': self.cancelled,
+            'timeouts': self.timeouts,
+        }
+
+    def close(self, timeout=10):
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
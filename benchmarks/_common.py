@@ -0,0 +1,46 @@
+"""Helpers shared by the benchmark scripts"""
+import threading
+import time
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class MemorySampler:
+    """Calls sample() every interval seconds in the background and keeps (seconds since start, value).
+
+    sample returns None (or raises) when there is no value right now - that
+    sample is skipped.
+    """
+
+    def __init__(self, sample, interval):
+        self.sample = sample
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._started = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                value = self.sample()
+            except Exception:
+                value = None
+            if value is not None:
+                self.samples.append((round(time.perf_counter() - self._started, 2), value))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,254 @@
+"""Reproducible benchmark of the render pipeline (no HTTP).
+
+Builds synthetic document_data payloads at scaling sizes, runs them through
+render_pdf_document and reports throughput, latency percentiles (of the whole
+pipeline and of the outline stage alone), peak memory and output size as JSON.
+A case whose render fails is reported with its error and fails the run -
+the fallback PDF is never measured.
+
+Usage:
+    python benchmarks/bench_render.py                          # all scenarios
+    python benchmarks/bench_render.py --scenario wide_tables --sizes 10 50
+    python benchmarks/bench_render.py --output baseline.json
+    python benchmarks/bench_render.py --baseline baseline.json  # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from _common import MemorySampler, percentile  # noqa: E402
+from browser_pool import shutdown_browser_pool  # noqa: E402
+from process_memory import process_tree_rss  # noqa: E402
+
+DEFAULT_SIZES = (10, 50, 200)
+WORDS = ('render', 'layout', 'browser', 'outline', 'document', 'markdown', 'chromium',
+         'table', 'cache', 'worker', 'latency', 'page', 'block', 'heading', 'export')
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _paragraph(rng, sentences=5):
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+
+def many_small_blocks(rng, size):
+    """size short Markdown blocks"""
+    return {
+        'title': f'Many small blocks ({size})',
+        'blocks': [
+            {'type': 'markdown', 'title': f'Block {i}', 'content': f'## Section {i}\n\n{_paragraph(rng, 2)}'}
+            for i in range(size)
+        ]
+    }
+
+
+def few_huge_blocks(rng, size):
+    """3 blocks with size paragraphs each"""
+    return {
+        'title': f'Few huge blocks ({size})',
+        'blocks': [
+            {'type': 'markdown', 'title': f'Chapter {i}',
+             'content': '\n\n'.join(_paragraph(rng, 8) for _ in range(size))}
+            for i in range(3)
+        ]
+    }
+
+
+def wide_tables(rng, size):
+    """Tables with 12 columns and size rows"""
+    columns = 12
+    header = '| ' + ' | '.join(f'Col {c}' for c in range(columns)) + ' |'
+    separator = '|' + '---|' * columns
+    rows = '\n'.join(
+        '| ' + ' | '.join(rng.choice(WORDS) for _ in range(columns)) + ' |'
+        for _ in range(size)
+    )
+    return {
+        'title': f'Wide tables ({size} rows)',
+        'blocks': [
+            {'type': 'markdown', 'title': f'Table {i}', 'content': f'{header}\n{separator}\n{rows}'}
+            for i in range(4)
+        ]
+    }
+
+
+def long_code(rng, size):
+    """Code blocks with size * 10 lines"""
+    lines = '\n'.join(
+        f'    result_{i} = compute_{rng.choice(WORDS)}(value_{i}, "{rng.choice(WORDS)}")  # {_sentence(rng, 4)}'
+        for i in range(size * 10)
+    )
+    return {
+        'title': f'Long code ({size * 10} lines)',
+        'blocks': [
+            {'type': 'code', 'title': f'Listing {i}', 'content': f'def listing_{i}():\n{lines}'}
+            for i in range(3)
+        ]
+    }
+
+
+def deep_headings(rng, size):
+    """size blocks with headings nested down to ######"""
+    content = '\n\n'.join(
+        f'{"#" * level} Level {level} heading\n\n{_sentence(rng)}'
+        for level in (1, 2, 3, 4, 5, 6, 3, 4, 2)
+    )
+    return {
+        'title': f'Deep headings ({size})',
+        'blocks': [
+            {'type': 'markdown', 'title': f'Part {i}', 'content': content}
+            for i in range(size)
+        ]
+    }
+
+
+SCENARIOS = {
+    'many_small_blocks': many_small_blocks,
+    'few_huge_blocks': few_huge_blocks,
+    'wide_tables': wide_tables,
+    'long_code': long_code,
+    'deep_headings': deep_headings,
+}
+
+
+def run_case(scenario, size, iterations, seed, cold):
+    rng = random.Random(f'{seed}-{scenario}-{size}')
+    document_data = SCENARIOS[scenario](rng, size)
+
+    render_latencies = []
+    bookmark_latencies = []
+    output_size = 0
+
+    # Warm-up: browser launch and imports are not part of the measurement.
+    # Its raw Chromium output (no outline yet) feeds the outline stage timing.
+    content_html, headings = app.build_document_body(document_data)
+    raw_pdf = app.render_body_to_pdf(content_html, app.get_template(document_data))
+
+    # RSS of this process and its Chromium children
+    with MemorySampler(process_tree_rss, 0.05) as sampler:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            if cold:
+                app.markdown_renderer = app.MarkdownBlockRenderer()
+
+            render_started = time.perf_counter()
+            with app.render_pdf_document(document_data) as pdf_file:
+                output_size = len(pdf_file.read())
+            render_latencies.append(time.perf_counter() - render_started)
+
+            bookmark_started = time.perf_counter()
+            heading_pages, _ = app.resolve_heading_pages(raw_pdf, headings)
+            app.outline_update(raw_pdf, document_data, headings, heading_pages)
+            bookmark_latencies.append(time.perf_counter() - bookmark_started)
+        elapsed = time.perf_counter() - started
+
+    return {
+        'scenario': scenario,
+        'size': size,
+        'iterations': iterations,
+        'throughput_docs_per_s': round(iterations / elapsed, 3),
+        'latency_s': {
+            'p50': round(percentile(render_latencies, 0.50), 4),
+            'p95': round(percentile(render_latencies, 0.95), 4),
+            'p99': round(percentile(render_latencies, 0.99), 4),
+        },
+        'bookmarks_latency_s': {
+            'p50': round(percentile(bookmark_latencies, 0.50), 4),
+            'p95': round(percentile(bookmark_latencies, 0.95), 4),
+        },
+        'peak_rss_bytes': {
+            'python': max((own for _, (own, _) in sampler.samples), default=0),
+            'chromium': max((children for _, (_, children) in sampler.samples), default=0),
+        },
+        'output_bytes': output_size,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of p95 latency, throughput and output size against a saved run"""
+    previous = {(case['scenario'], case['size']): case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        old = previous.get((case['scenario'], case['size']))
+        if old is None or 'error' in case or 'error' in old:
+            continue
+        checks = (
+            ('latency_s.p95', case['latency_s']['p95'], old['latency_s']['p95'], True),
+            ('throughput_docs_per_s', case['throughput_docs_per_s'], old['throughput_docs_per_s'], False),
+            ('output_bytes', case['output_bytes'], old['output_bytes'], True),
+        )
+        for metric, new_value, old_value, higher_is_worse in checks:
+            if not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append({
+                    'scenario': case['scenario'],
+                    'size': case['size'],
+                    'metric': metric,
+                    'baseline': old_value,
+                    'current': new_value,
+                    'change': round(change, 4),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PDF render pipeline')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (repeatable, default: all)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--seed', default='gpttopdf')
+    parser.add_argument('--cold', action='store_true', help='Clear the Markdown block cache before every iteration')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', help='Compare against a saved report')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative change before a regression is reported')
+    args = parser.parse_args()
+
+    cases = []
+    for scenario in args.scenario or sorted(SCENARIOS):
+        for size in args.sizes:
+            print(f'⏱️  {scenario} (size {size})...', file=sys.stderr)
+            try:
+                cases.append(run_case(scenario, size, args.iterations, args.seed, args.cold))
+            except Exception as e:
+                print(f'❌ {scenario} (size {size}) failed: {e}', file=sys.stderr)
+                cases.append({'scenario': scenario, 'size': size, 'error': str(e)})
+
+    results = {
+        'renderer_version': app.RENDERER_VERSION,
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'cases': cases,
+    }
+
+    exit_code = 1 if any('error' in case for case in cases) else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['regressions'] = compare(results, json.load(f), args.tolerance)
+        if results['regressions']:
+            exit_code = 1
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    print(report)
+
+    shutdown_browser_pool()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
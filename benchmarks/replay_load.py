@@ -0,0 +1,361 @@
+"""Replay load test against a running instance, driven by captured JSONL traffic.
+
+Every line of the input files is one request:
+  - document_data ({"title": ..., "blocks": [...]}) - POSTed to /create_pdf
+  - {"path": "/batch", "body": {...}} - POSTed to that path. A 202 answer
+    (queued render job) is followed: /jobs/<id> is polled until the job
+    finished and its result is downloaded, so the latency covers the job
+  - {"title": ..., "body": "text"} (e.g. the repo's requests.jsonl) - the text
+    becomes a single Markdown block
+
+Closed loop (--concurrency): N clients, each sends its next request as soon
+as the previous one completed. Open loop (--rate): requests arrive at a fixed
+average rate (Poisson or uniform) no matter how fast the server answers;
+latency is measured from the scheduled arrival, so queueing is not hidden.
+Several levels run one after another and give a capacity curve.
+
+Reports throughput, latency percentiles (overall and per path), 429 and
+error rates per level plus server memory over time (from /metrics, a gunicorn pid file or a docker
+container) as JSON.
+
+Usage:
+    python benchmarks/replay_load.py captures.jsonl --concurrency 1 2 4 8 --duration 60
+    python benchmarks/replay_load.py requests.jsonl --rate 2 5 10 --arrivals poisson --bust-cache
+    python benchmarks/replay_load.py captures.jsonl -c 4 --container gpttopdf --output load.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _common import MemorySampler, percentile  # noqa: E402
+from process_memory import process_tree_rss  # noqa: E402
+
+DEFAULT_URL = 'http://127.0.0.1:5000'
+MEMORY_PATTERN = re.compile(r'^gpttopdf_memory_rss_bytes\{[^}]*\} (\S+)$', re.MULTILINE)
+JOB_POLL_INTERVAL = 0.25
+# Outcomes of a render job that was accepted (202) but produced no result
+JOB_FAILED = 'job_failed'
+JOB_TIMEOUT = 'job_timeout'
+DOCKER_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3, 'kB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3}
+
+
+def load_requests(paths):
+    """(path, body) for every usable line of the JSONL files"""
+    requests = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    print(f'⚠️  {path}:{number}: invalid JSON, skipped', file=sys.stderr)
+                    continue
+                if not isinstance(entry, dict):
+                    continue
+                if 'path' in entry and isinstance(entry.get('body'), (dict, list)):
+                    requests.append((entry['path'], entry['body']))
+                elif 'blocks' in entry:
+                    requests.append(('/create_pdf', entry))
+                elif isinstance(entry.get('body'), str):
+                    requests.append(('/create_pdf', {
+                        'title': entry.get('title') or entry.get('request_id') or f'Request {number}',
+                        'blocks': [{'type': 'markdown', 'title': '', 'content': entry['body']}]
+                    }))
+    return requests
+
+
+def bust_cache(body, nonce):
+    """A copy whose title differs per request - forces a real render instead of a cache hit"""
+    if isinstance(body, dict) and 'blocks' in body:
+        return dict(body, title=f"{body.get('title', '')} #{nonce}")
+    if isinstance(body, dict) and isinstance(body.get('documents'), list):
+        return dict(body, documents=[bust_cache(document, nonce) for document in body['documents']])
+    return body
+
+
+def fetch(request, timeout):
+    """(status, JSON body or None) of one request - the body is read to the end; status 0 for connection errors"""
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            if response.headers.get_content_type() == 'application/json':
+                return response.status, json.loads(response.read())
+            while response.read(64 * 1024):
+                pass
+            return response.status, None
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, OSError, ValueError):
+        return 0, None
+
+
+def follow_job(url, job, deadline):
+    """Poll an accepted render job until it finished, then download its result - returns the final status"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return JOB_TIMEOUT
+        time.sleep(min(JOB_POLL_INTERVAL, remaining))
+        status, answer = fetch(url + job['status_url'], max(1.0, remaining))
+        if status != 200:
+            return status
+        if answer['status'] == 'done':
+            return fetch(url + job['pdf_url'], max(1.0, deadline - time.perf_counter()))[0]
+        if answer['status'] == 'failed':
+            return JOB_FAILED
+
+
+def send(url, path, body, timeout):
+    """POST one request and follow a render job it queued - returns (status, seconds)"""
+    data = json.dumps(body).encode('utf-8')
+    request = urllib.request.Request(url + path, data=data, headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    status, answer = fetch(request, timeout)
+    if status == 202 and answer and 'status_url' in answer:
+        status = follow_job(url, answer, started + timeout)
+    return status, time.perf_counter() - started
+
+
+class ServerMemory:
+    """Server memory: docker container, pid file process tree or /metrics gauges"""
+
+    def __init__(self, url, container=None, pidfile=None):
+        self.url = url
+        self.container = container
+        self.pidfile = pidfile
+        self.source = 'container' if container else 'pidfile' if pidfile else 'metrics'
+
+    def sample(self):
+        if self.container:
+            output = subprocess.run(
+                ['docker', 'stats', '--no-stream', '--format', '{{.MemUsage}}', self.container],
+                capture_output=True, text=True, timeout=10
+            ).stdout
+            match = re.match(r'\s*([\d.]+)\s*([A-Za-z]+)', output)
+            return int(float(match.group(1)) * DOCKER_UNITS[match.group(2)]) if match else None
+        if self.pidfile:
+            with open(self.pidfile) as f:
+                own, children = process_tree_rss(int(f.read().strip()))
+            return own + children
+        with urllib.request.urlopen(self.url + '/metrics', timeout=5) as response:
+            text = response.read().decode('utf-8')
+        values = MEMORY_PATTERN.findall(text)
+        return int(sum(float(value) for value in values)) if values else None
+
+
+class Recorder:
+    """Outcomes of one load level"""
+
+    def __init__(self):
+        self.results = []  # (finished at, path, status, latency)
+        self._lock = threading.Lock()
+        self._nonce = 0
+
+    def next_nonce(self):
+        with self._lock:
+            self._nonce += 1
+            return self._nonce
+
+    def record(self, finished, path, status, latency):
+        with self._lock:
+            self.results.append((finished, path, status, latency))
+
+    def summary(self, elapsed):
+        statuses = {}
+        latencies = []
+        paths = {}
+        for _, path, status, latency in self.results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            outcome = paths.setdefault(path, {'requests': 0, 'latencies': []})
+            outcome['requests'] += 1
+            # A 202 that was not followed to a result is no goodput
+            if isinstance(status, int) and 200 <= status < 400 and status != 202:
+                latencies.append(latency)
+                outcome['latencies'].append(latency)
+        total = len(self.results)
+        rejected = statuses.get('429', 0)
+        errors = total - len(latencies) - rejected
+        return {
+            'requests': total,
+            'duration_s': round(elapsed, 2),
+            'throughput_per_s': round(total / elapsed, 3) if elapsed else 0.0,
+            'goodput_per_s': round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+            'latency_s': {
+                'p50': round(percentile(latencies, 0.50), 4),
+                'p90': round(percentile(latencies, 0.90), 4),
+                'p95': round(percentile(latencies, 0.95), 4),
+                'p99': round(percentile(latencies, 0.99), 4),
+                'max': round(max(latencies), 4) if latencies else 0.0,
+            },
+            'rate_429': round(rejected / total, 4) if total else 0.0,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'statuses': statuses,
+            'paths': {
+                path: {
+                    'requests': outcome['requests'],
+                    'completed': len(outcome['latencies']),
+                    'latency_s': {
+                        'p50': round(percentile(outcome['latencies'], 0.50), 4),
+                        'p95': round(percentile(outcome['latencies'], 0.95), 4),
+                    },
+                }
+                for path, outcome in sorted(paths.items())
+            },
+        }
+
+
+def pick(requests, rng, args, recorder):
+    path, body = rng.choice(requests)
+    if args.bust_cache:
+        body = bust_cache(body, recorder.next_nonce())
+    return path, body
+
+
+def run_closed(requests, args, concurrency, recorder):
+    """concurrency clients, each waiting for its answer before the next request"""
+    deadline = time.perf_counter() + args.duration
+    remaining = [args.requests] if args.requests else None
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(f'{args.seed}-{concurrency}-{index}')
+        while time.perf_counter() < deadline:
+            if remaining is not None:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            path, body = pick(requests, rng, args, recorder)
+            status, latency = send(args.url, path, body, args.timeout)
+            recorder.record(time.perf_counter(), path, status, latency)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(requests, args, rate, recorder):
+    """Arrivals at rate per second - latency counts from the scheduled arrival"""
+    rng = random.Random(f'{args.seed}-{rate}')
+    started = time.perf_counter()
+    deadline = started + args.duration
+    in_flight = threading.BoundedSemaphore(args.max_in_flight)
+
+    def fire(path, body, scheduled):
+        try:
+            status, _ = send(args.url, path, body, args.timeout)
+            finished = time.perf_counter()
+            recorder.record(finished, path, status, finished - scheduled)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as executor:
+        scheduled = started
+        sent = 0
+        while True:
+            interval = rng.expovariate(rate) if args.arrivals == 'poisson' else 1.0 / rate
+            scheduled += interval
+            if scheduled >= deadline or (args.requests and sent >= args.requests):
+                break
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            path, body = pick(requests, rng, args, recorder)
+            if not in_flight.acquire(blocking=False):
+                # Client-side overload - counted as an error, not silently delayed
+                recorder.record(time.perf_counter(), path, 0, 0.0)
+                continue
+            executor.submit(fire, path, body, scheduled)
+            sent += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured requests against a running instance')
+    parser.add_argument('inputs', nargs='+', help='JSONL files with captured requests')
+    parser.add_argument('--url', default=DEFAULT_URL, help=f'Base URL of the instance (default: {DEFAULT_URL})')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('-c', '--concurrency', type=int, nargs='+', help='Closed loop: concurrent clients per level')
+    mode.add_argument('-r', '--rate', type=float, nargs='+', help='Open loop: arrivals per second per level')
+    parser.add_argument('--arrivals', choices=('poisson', 'uniform'), default='poisson')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per level')
+    parser.add_argument('--requests', type=int, help='Stop a level after this many requests')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='Open loop: client-side limit of open requests')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds per request (render jobs: until their result is downloaded)')
+    parser.add_argument('--bust-cache', action='store_true', help='Vary every title so the PDF cache cannot answer')
+    parser.add_argument('--pause', type=float, default=5, help='Seconds between levels')
+    parser.add_argument('--seed', default='gpttopdf')
+    parser.add_argument('--container', help='Sample memory of this docker container')
+    parser.add_argument('--pidfile', help='Sample memory of this process tree (e.g. /tmp/gunicorn.pid)')
+    parser.add_argument('--memory-interval', type=float, default=1.0)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    requests = load_requests(args.inputs)
+    if not requests:
+        print('No requests found in the input files', file=sys.stderr)
+        return 1
+    args.url = args.url.rstrip('/')
+
+    levels = [('rate', rate) for rate in args.rate] if args.rate else \
+        [('concurrency', concurrency) for concurrency in (args.concurrency or [1])]
+
+    results = []
+    for position, (kind, value) in enumerate(levels):
+        if position:
+            time.sleep(args.pause)
+        print(f'🚦 {kind} {value} for {args.duration:g}s ({len(requests)} captured requests)...', file=sys.stderr)
+        recorder = Recorder()
+        server = ServerMemory(args.url, args.container, args.pidfile)
+        with MemorySampler(server.sample, args.memory_interval) as sampler:
+            started = time.perf_counter()
+            if kind == 'rate':
+                run_open(requests, args, value, recorder)
+            else:
+                run_closed(requests, args, value, recorder)
+            elapsed = time.perf_counter() - started
+
+        level = {kind: value, **recorder.summary(elapsed)}
+        level['memory'] = {
+            'source': server.source,
+            'peak_bytes': max((memory for _, memory in sampler.samples), default=None),
+            'samples': sampler.samples,
+        }
+        results.append(level)
+        print(
+            f"   {level['throughput_per_s']} req/s, p95 {level['latency_s']['p95']}s, "
+            f"429 {level['rate_429']:.1%}, errors {level['error_rate']:.1%}",
+            file=sys.stderr
+        )
+
+    report = json.dumps({
+        'url': args.url,
+        'mode': 'open' if args.rate else 'closed',
+        'arrivals': args.arrivals if args.rate else None,
+        'bust_cache': args.bust_cache,
+        'python': platform.python_version(),
+        'inputs': args.inputs,
+        'levels': results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""Warm Chromium pool - keeps browsers alive for the lifetime of a worker process"""
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Enhanced browser launch for Docker/Linux
+CHROMIUM_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-web-security',
+    '--disable-features=VizDisplayCompositor',
+    '--run-all-compositor-stages-before-draw',
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-ipc-flooding-protection'
+]
+
+# Pool configuration (per worker process)
+POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', '1'))
+MAX_RENDERS_PER_BROWSER = int(os.environ.get('BROWSER_MAX_RENDERS', '200'))
+# Well below gunicorn's 30 s worker timeout - a request must not be killed while it waits
+ACQUIRE_TIMEOUT = float(os.environ.get('BROWSER_ACQUIRE_TIMEOUT', '10'))
+
+# 'sync': a browser per slot, one page each; 'async': one browser, many pages (async_browser.py)
+RENDER_ENGINE = os.environ.get('RENDER_ENGINE', 'sync')
+ASYNC_MAX_PAGES = int(os.environ.get('ASYNC_MAX_PAGES', '8'))
+# Renders a worker can run at once
+RENDER_PARALLELISM = ASYNC_MAX_PAGES if RENDER_ENGINE == 'async' else POOL_SIZE
+
+
+# Queue marker: close the browser, the next render launches a fresh one
+RECYCLE = object()
+
+
+class BrowserPoolTimeout(Exception):
+    """No browser slot became free in time"""
+
+
+class RenderCancelled(Exception):
+    """The client went away - the render was abandoned"""
+
+
+# Playwright messages of a browser that failed to start, crashed or lost its connection
+BROWSER_FAILURE_MARKERS = (
+    'BrowserType.launch',
+    "Executable doesn't exist",
+    'Target crashed',
+    'has been closed',
+    'has disconnected',
+    'Browser closed',
+    'Connection closed',
+)
+
+
+def is_browser_failure(error):
+    """True if error says Chromium itself is broken - not the document, a timeout or a busy pool"""
+    from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+    if not isinstance(error, PlaywrightError) or isinstance(error, PlaywrightTimeout):
+        return False
+    message = str(error)
+    return any(marker in message for marker in BROWSER_FAILURE_MARKERS)
+
+
+class BrowserSlot:
+    """One Chromium instance, owned by a dedicated thread.
+
+    The sync Playwright API is bound to the thread that started it, so every
+    slot runs its own thread and callers hand work over via a queue.
+    """
+
+    def __init__(self, index, max_renders, launch_args):
+        self.index = index
+        self.max_renders = max_renders
+        self.launch_args = launch_args
+        self.renders = 0
+        self.total_renders = 0
+        self.launches = 0
+        self._playwright = None
+        self._browser = None
+        self._warm_pages = {}  # warm_key -> page with a template already loaded
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f'browser-slot-{index}', daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def is_warm(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    def submit(self, fn, context_options=None, warm_key=None, warm_setup=None):
+        """Schedule fn(page) on this slot and return a Future"""
+        future = Future()
+        self._jobs.put((fn, context_options, warm_key, warm_setup, future))
+        return future
+
+    def recycle(self):
+        """Close the browser once the current render is done (memory pressure)"""
+        self._jobs.put(RECYCLE)
+
+    def close(self, timeout=10):
+        self._jobs.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                if job is RECYCLE:
+                    if self._browser is not None:
+                        logger.info(f"♻️ Recycling browser in slot {self.index} to free memory")
+                        self._close_browser()
+                    continue
+                fn, context_options, warm_key, warm_setup, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if warm_key is None:
+                        result = self._render(fn, context_options)
+                    else:
+                        result = self._render_warm(fn, warm_key, warm_setup, context_options)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            self._close_browser()
+            if self._playwright is not None:
+                try:
+                    self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+    def _ensure_browser(self):
+        """Return a healthy browser, replacing a crashed one"""
+        if self._browser is not None and not self._browser.is_connected():
+            logger.warning(f"💥 Browser in slot {self.index} disconnected - replacing it")
+            self._close_browser()
+
+        if self._browser is None:
+            if self._playwright is None:
+                from playwright.sync_api import sync_playwright
+                self._playwright = sync_playwright().start()
+            logger.info(f"🌐 Launching browser for slot {self.index}...")
+            with metrics.timer('browser_launch'):
+                self._browser = self._playwright.chromium.launch(
+                    headless=True,
+                    args=self.launch_args
+                )
+            self.renders = 0
+            self.launches += 1
+
+        return self._browser
+
+    def _render(self, fn, context_options=None):
+        browser = self._ensure_browser()
+        # Fresh isolated context per render - no cookies, storage or scripts outlive a request
+        context = browser.new_context(**(context_options or {}))
+        try:
+            page = context.new_page()
+            return fn(page)
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+            self._count_render()
+
+    def _render_warm(self, fn, warm_key, warm_setup, context_options=None):
+        """Run fn on a long-lived page prepared once by warm_setup(page).
+
+        The page lives in a context of its own with JavaScript disabled, so
+        nothing of one document can run on into the next; it is dropped
+        after any error so a broken page never serves a second render.
+        """
+        browser = self._ensure_browser()
+        page = self._warm_pages.get(warm_key)
+        if page is not None and page.is_closed():
+            self._discard_warm_page(warm_key)
+            page = None
+
+        try:
+            if page is None:
+                context = browser.new_context(**{**(context_options or {}), 'java_script_enabled': False})
+                page = self._warm_pages[warm_key] = context.new_page()
+                warm_setup(page)
+            return fn(page)
+        except BaseException:
+            self._discard_warm_page(warm_key)
+            raise
+        finally:
+            self._count_render()
+
+    def _discard_warm_page(self, warm_key):
+        page = self._warm_pages.pop(warm_key, None)
+        if page is None:
+            return
+        try:
+            page.context.close()
+        except Exception:
+            pass
+
+    def _count_render(self):
+        self.renders += 1
+        self.total_renders += 1
+        if self.renders >= self.max_renders:
+            logger.info(f"♻️ Recycling browser in slot {self.index} after {self.renders} renders")
+            self._close_browser()
+
+    def _close_browser(self):
+        for warm_key in list(self._warm_pages):
+            self._discard_warm_page(warm_key)
+        if self._browser is None:
+            return
+        try:
+            self._browser.close()
+        except Exception:
+            pass
+        self._browser = None
+
+
+class BrowserPool:
+    """Hands out fresh pages on warm browsers, at most one page per slot at a time"""
+
+    def __init__(self, size=POOL_SIZE, max_renders=MAX_RENDERS_PER_BROWSER,
+                 acquire_timeout=ACQUIRE_TIMEOUT, launch_args=None):
+        self.pid = os.getpid()
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.Queue()
+        self._slots = [
+            BrowserSlot(i, max_renders, launch_args or CHROMIUM_ARGS)
+            for i in range(max(1, size))
+        ]
+        for slot in self._slots:
+            self._idle.put(slot)
+
+    @property
+    def size(self):
+        return len(self._slots)
+
+    def run(self, fn, timeout=None, context_options=None, warm_key=None, warm_setup=None):
+        """Run fn(page) on a fresh page of a warm browser and return its result
+
+        The page gets a context of its own, created with context_options and
+        closed after the render. With a warm_key, fn instead gets a page that
+        is kept open between renders and was prepared once with
+        warm_setup(page); scripts are disabled in its context.
+        """
+        requested = time.perf_counter()
+        try:
+            slot = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise BrowserPoolTimeout(f"No browser available after {self.acquire_timeout}s")
+
+        try:
+            return self._run_on(slot, fn, timeout, context_options, warm_key, warm_setup, requested)
+        finally:
+            self._idle.put(slot)
+
+    def _run_on(self, slot, fn, timeout=None, context_options=None, warm_key=None, warm_setup=None, requested=None):
+        requested = requested or time.perf_counter()
+
+        def timed(page):
+            # Queue wait + (re)launch + fresh context/page
+            metrics.observe_stage('browser_acquire', time.perf_counter() - requested)
+            return fn(page)
+
+        return slot.submit(timed, context_options, warm_key, warm_setup).result(timeout=timeout)
+
+    @contextmanager
+    def reserve(self, count):
+        """Take count idle slots at once, or none - yields one run function per slot (empty list if not all were free)"""
+        slots = []
+        while len(slots) < count:
+            try:
+                slots.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        if len(slots) < count:
+            for slot in slots:
+                self._idle.put(slot)
+            slots = []
+        try:
+            yield [functools.partial(self._run_on, slot) for slot in slots]
+        finally:
+            for slot in slots:
+                self._idle.put(slot)
+
+    def stats(self):
+        return {
+            'engine': 'sync',
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'warm': sum(1 for slot in self._slots if slot.is_warm),
+            'launches': sum(slot.launches for slot in self._slots),
+            'renders': sum(slot.total_renders for slot in self._slots),
+        }
+
+    def recycle(self):
+        for slot in self._slots:
+            slot.recycle()
+
+    def close(self):
+        for slot in self._slots:
+            slot.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Return this process' pool (or async engine), creating it on first use.
+
+    With gunicorn's preload_app the module is imported in the master, so the
+    pool must never be created before fork - the pid check makes sure every
+    worker starts its own browsers.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            if RENDER_ENGINE == 'async':
+                from async_browser import AsyncBrowserEngine
+                _pool = AsyncBrowserEngine()
+            else:
+                _pool = BrowserPool()
+            logger.info(f"🏊 {RENDER_ENGINE.capitalize()} render engine ready in worker {_pool.pid} ({_pool.size} slot(s))")
+        return _pool
+
+
+def shutdown_browser_pool():
+    """Close all browsers of this process' pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+def recycle_browser_pool():
+    """Restart the browsers of this process' pool, if it has one"""
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.recycle()
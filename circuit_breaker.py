@@ -0,0 +1,111 @@
+"""Circuit breaker around the Chromium renderer.
+
+After FAILURE_THRESHOLD consecutive render failures the breaker opens and
+callers stop sending work to Chromium. A background thread then probes the
+renderer every RESET_TIMEOUT seconds and closes the breaker on the first
+successful probe. State is per worker process, like the browser pool.
+"""
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '3'))
+RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', '30'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+
+metrics.describe('gpttopdf_circuit_open', 'gauge', 'Workers whose Chromium circuit breaker is open')
+metrics.describe('gpttopdf_circuit_trips_total', 'counter', 'Times a circuit breaker opened')
+
+
+class CircuitOpen(Exception):
+    """The renderer is switched off until a recovery probe succeeds"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a background recovery probe"""
+
+    def __init__(self, name, probe, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self.last_error = None
+        self.last_probe = None
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    def allow(self):
+        """False while the breaker is open"""
+        return self.state == CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == OPEN or self.failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self.opened_at = time.time()
+            self.trips += 1
+            self._start_probe()
+
+        logger.error(f"🔌 Circuit '{self.name}' opened after {self.failures} failures: {error}")
+        metrics.inc('gpttopdf_circuit_trips_total', circuit=self.name)
+        metrics.set_gauge('gpttopdf_circuit_open', 1, circuit=self.name)
+
+    def _start_probe(self):
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(
+            target=self._run_probe, name=f'circuit-probe-{self.name}', daemon=True
+        )
+        self._probe_thread.start()
+
+    def _run_probe(self):
+        while True:
+            time.sleep(self.reset_timeout)
+            self.last_probe = time.time()
+            try:
+                self.probe()
+            except Exception as e:
+                logger.warning(f"🔌 Circuit '{self.name}' probe failed: {str(e)}")
+                with self._lock:
+                    self.last_error = str(e)
+                continue
+
+            with self._lock:
+                self.state = CLOSED
+                self.failures = 0
+                self.opened_at = None
+            logger.info(f"🔌 Circuit '{self.name}' closed - renderer recovered")
+            metrics.set_gauge('gpttopdf_circuit_open', 0, circuit=self.name)
+            return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'failures': self.failures,
+                'failure_threshold': self.failure_threshold,
+                'trips': self.trips,
+                'opened_at': self.opened_at,
+                'last_error': self.last_error,
+                'last_probe': self.last_probe,
+                'reset_timeout': self.reset_timeout,
+            }
@@ -0,0 +1,206 @@
+"""Offline bulk converter - Markdown files and document_data JSON to PDF, no HTTP.
+
+Inputs are split across a process pool; every process keeps one warm
+browser for its whole lifetime. Outputs whose input (and renderer) did not
+change since the last run are skipped, using the same content hash as the
+PDF cache, recorded in a manifest in the output directory.
+
+Usage:
+    python convert.py docs/                          # every .md/.json below docs/, PDFs next to them
+    python convert.py 'notes/**/*.md' -o out/ -j 4   # glob, separate output tree, 4 processes
+    python convert.py docs/ --force                  # re-render everything
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util
+
+# Keep this run's counters out of the web app's /metrics
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'gpttopdf-cli-metrics'))
+
+import app  # noqa: E402
+from browser_pool import shutdown_browser_pool  # noqa: E402
+from document_intake import validate_document  # noqa: E402
+from pdf_cache import document_cache_key  # noqa: E402
+
+INPUT_SUFFIXES = ('.md', '.markdown', '.json')
+MANIFEST_NAME = '.gpttopdf-manifest.json'
+
+
+def find_inputs(patterns):
+    """Input files from directories (recursive), globs and plain paths - sorted, unique"""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                found.update(os.path.join(root, name) for name in files if name.lower().endswith(INPUT_SUFFIXES))
+        else:
+            matches = glob.glob(pattern, recursive=True) or ([pattern] if os.path.exists(pattern) else [])
+            found.update(path for path in matches if os.path.isfile(path))
+    return sorted(found)
+
+
+def load_document(path):
+    """document_data for a .md or .json file - raises ValueError"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+
+    if path.lower().endswith('.json'):
+        document_data = json.loads(text)
+        error = validate_document(document_data, app.PDF_TEMPLATES)
+        if error:
+            raise ValueError(error)
+        return document_data
+
+    # Markdown: a leading '# Heading' becomes the document title
+    title = os.path.splitext(os.path.basename(path))[0]
+    lines = text.lstrip('\ufeff').splitlines()
+    if lines and lines[0].startswith('# '):
+        title = lines[0][2:].strip()
+        text = '\n'.join(lines[1:])
+    return {'title': title, 'blocks': [{'type': 'markdown', 'title': '', 'content': text}]}
+
+
+def output_path(path, output_dir, base_dir):
+    stem = os.path.splitext(path)[0] + '.pdf'
+    if output_dir is None:
+        return stem
+    return os.path.join(output_dir, os.path.relpath(stem, base_dir))
+
+
+def write_atomic(path, fileobj):
+    """Copy fileobj to path via a temp file in the same directory"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _init_worker():
+    # Close this process' browser when the pool shuts down (atexit does not run in pool workers)
+    util.Finalize(None, shutdown_browser_pool, exitpriority=10)
+
+
+def convert_one(source, target):
+    """Render one document in a pool process - returns (source, target, seconds, bytes)"""
+    started = time.perf_counter()
+    document_data = load_document(source)
+    with app.render_pdf_document(document_data) as pdf_file:
+        write_atomic(target, pdf_file)
+    return source, target, time.perf_counter() - started, os.path.getsize(target)
+
+
+class Manifest:
+    """Content hash of every output written, keyed by output path"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def is_current(self, target, key):
+        return self.entries.get(os.path.abspath(target)) == key and os.path.exists(target)
+
+    def record(self, target, key):
+        self.entries[os.path.abspath(target)] = key
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert Markdown / document_data JSON files to PDF')
+    parser.add_argument('inputs', nargs='+', help='Files, directories or glob patterns')
+    parser.add_argument('-o', '--output', help='Output directory (default: next to each input)')
+    parser.add_argument('-j', '--jobs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Processes, each with its own warm browser')
+    parser.add_argument('--force', action='store_true', help='Render even if the output is up to date')
+    args = parser.parse_args()
+
+    sources = find_inputs(args.inputs)
+    if not sources:
+        print('No input files found', file=sys.stderr)
+        return 1
+
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in sources])
+    manifest = Manifest(os.path.abspath(args.output) if args.output else base_dir)
+
+    pending = []
+    skipped = 0
+    failed = 0
+    for source in sources:
+        target = output_path(os.path.abspath(source), args.output and os.path.abspath(args.output), base_dir)
+        try:
+            key = document_cache_key(load_document(source), app.RENDERER_VERSION)
+        except (OSError, ValueError) as e:
+            print(f'❌ {source}: {e}', file=sys.stderr)
+            failed += 1
+            continue
+        if not args.force and manifest.is_current(target, key):
+            skipped += 1
+            continue
+        pending.append((source, target, key))
+
+    print(f'📄 {len(sources)} input(s): {len(pending)} to render, {skipped} up to date', file=sys.stderr)
+
+    done = 0
+    finished = 0
+    total_bytes = 0
+    started = time.perf_counter()
+    if pending:
+        try:
+            with ProcessPoolExecutor(max_workers=min(args.jobs, len(pending)), initializer=_init_worker) as executor:
+                futures = {executor.submit(convert_one, source, target): (source, target, key)
+                           for source, target, key in pending}
+                for future in as_completed(futures):
+                    source, target, key = futures[future]
+                    finished += 1
+                    try:
+                        _, _, seconds, size = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f'[{finished}/{len(pending)}] ❌ {source}: {e}', file=sys.stderr)
+                        continue
+                    done += 1
+                    total_bytes += size
+                    manifest.record(target, key)
+                    elapsed = time.perf_counter() - started
+                    print(f'[{finished}/{len(pending)}] ✅ {target} ({seconds:.2f}s, {size // 1024} KB) '
+                          f'- {done / elapsed:.2f} docs/s', file=sys.stderr)
+        finally:
+            # Interrupted runs keep what they finished
+            manifest.save()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f'🏁 {done} rendered, {skipped} skipped, {failed} failed in {elapsed:.1f}s'
+        + (f' ({done / elapsed:.2f} docs/s, {total_bytes / elapsed / 1024 / 1024:.2f} MB/s)' if done else ''),
+        file=sys.stderr
+    )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -39,13 +39,21 @@ echo "🔄 Restarting services..."
 docker-compose stop gpttopdf 2>/dev/null || true
 docker-compose up -d gpttopdf
 
-# Health check
-echo "🏥 Performing health check..."
-sleep 10
-if curl -f http://localhost:5000 >/dev/null 2>&1; then
-    echo "✅ Service is running on localhost:5000"
+# Readiness check - workers answer only once their browsers are warm
+echo "🏥 Waiting for readiness..."
+READY=false
+for i in $(seq 1 60); do
+    if curl -sf http://localhost:5000/healthz/ready >/dev/null 2>&1; then
+        READY=true
+        break
+    fi
+    sleep 1
+done
+if [[ "$READY" == "true" ]]; then
+    echo "✅ Service is ready on localhost:5000 (after ${i}s)"
 else
-    echo "❌ Health check failed. Check logs with: docker-compose logs gpttopdf"
+    echo "❌ Service not ready after 60s. Check: curl http://localhost:5000/healthz/ready"
+    echo "   and the logs with: docker-compose logs gpttopdf"
 fi
 
 # Status and logs for debugging
@@ -0,0 +1,78 @@
+"""Request intake - bounded reading of JSON bodies and document_data validation.
+
+The body is read in chunks and rejected as soon as it exceeds the limit,
+so an oversized upload never sits in memory as a whole. Validation walks
+the parsed payload in place without building copies or repr strings.
+"""
+import json
+import os
+
+MAX_DOCUMENT_BYTES = int(os.environ.get('PDF_MAX_REQUEST_MB', '10')) * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+BLOCK_FIELDS = ('type', 'title', 'content')
+
+
+class IntakeError(Exception):
+    """The request body was rejected - carries the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def read_json_body(stream, content_length=None, limit=MAX_DOCUMENT_BYTES):
+    """Read and parse a JSON body of at most limit bytes - returns (data, size)"""
+    if content_length is not None and content_length > limit:
+        raise IntakeError(f'Content too large (max {limit // (1024 * 1024)}MB)', 413)
+
+    body = bytearray()
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        body += chunk
+        if len(body) > limit:
+            raise IntakeError(f'Content too large (max {limit // (1024 * 1024)}MB)', 413)
+
+    if not body:
+        raise IntakeError('No data provided')
+    try:
+        # json.loads detects UTF-8/16/32 on bytes itself - no decoded copy of the body
+        data = json.loads(body)
+    except ValueError:
+        raise IntakeError('Invalid JSON')
+    return data, len(body)
+
+
+def validate_document(document_data, themes=()):
+    """Check the document_data structure - returns an error message or None
+
+    A null title is normalized to '' in place, the renderers expect a string.
+    """
+    if not isinstance(document_data, dict):
+        return 'Invalid data format'
+    if not document_data:
+        return 'No data provided'
+
+    title = document_data.get('title')
+    if title is None and 'title' in document_data:
+        document_data['title'] = ''
+    elif title is not None and not isinstance(title, str):
+        return "'title' must be a string"
+
+    theme = document_data.get('theme')
+    if theme is not None and (not isinstance(theme, str) or theme not in themes):
+        return f"Unknown theme (available: {', '.join(themes)})"
+
+    blocks = document_data.get('blocks', [])
+    if not isinstance(blocks, list):
+        return "'blocks' must be a list"
+    for index, block in enumerate(blocks):
+        if not isinstance(block, dict):
+            return f'Block {index} must be an object'
+        for field in BLOCK_FIELDS:
+            if field in block and not isinstance(block[field], str):
+                return f"Block {index}: '{field}' must be a string"
+    return None
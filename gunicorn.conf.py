@@ -1,18 +1,25 @@
 # Gunicorn configuration file
 import multiprocessing
+import os
 
 # Server socket
 bind = "0.0.0.0:5000"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
+# Rule of thumb by default - measure with benchmarks/replay_load.py and set GUNICORN_WORKERS
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
 worker_class = "sync"
+# The async render engine renders many pages per worker - it needs request threads
+if os.environ.get('RENDER_ENGINE', 'sync') == 'async':
+    worker_class = "gthread"
+    threads = int(os.environ.get('GUNICORN_THREADS', os.environ.get('ASYNC_MAX_PAGES', '8')))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
 
 # Restart workers after this many requests, to prevent memory leaks
+# (memory itself is bounded by WORKER_MEMORY_BUDGET_MB, see memory_watchdog.py)
 max_requests = 1000
 max_requests_jitter = 50
 
@@ -32,3 +39,42 @@ pidfile = '/tmp/gunicorn.pid'
 user = None
 group = None
 tmp_upload_dir = None
+
+
+# Server hooks
+def on_starting(server):
+    """Drop metric snapshots of a previous run"""
+    import metrics
+    metrics.clear()
+
+def when_ready(server):
+    """Import the lazily loaded libraries once in the master - forked workers share them.
+
+    Also starts the job runner, which picks up jobs queued before a restart.
+    """
+    if preload_app:
+        from app import import_heavy_modules
+        import_heavy_modules()
+    from render_jobs import JobStore, ensure_job_runner
+    ensure_job_runner(JobStore())
+
+def post_fork(server, worker):
+    """Watch the memory of this worker and warm it up before it accepts requests"""
+    from memory_watchdog import start_memory_watchdog
+    start_memory_watchdog()
+    # Blocks until the browsers are up (WORKER_PREWARM_TIMEOUT stays below timeout)
+    import app
+    if app.WORKER_PREWARM:
+        app.prewarm_worker()
+
+def worker_exit(server, worker):
+    """Close the worker's warm Chromium pool (browsers are started lazily after fork)"""
+    from browser_pool import shutdown_browser_pool
+    import metrics
+    shutdown_browser_pool()
+    metrics.flush()
+
+def on_exit(server):
+    """Let the job runner finish its running jobs and exit with the server"""
+    from render_jobs import JobStore, stop_job_runner
+    stop_job_runner(JobStore())
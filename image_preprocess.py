@@ -0,0 +1,125 @@
+"""Data-URI image preprocessing - pasted images downscaled to their printed size.
+
+Images pasted into Markdown blocks arrive as base64 data URIs, often at
+screenshot or camera resolution, and Chromium decodes every one at full
+size on every render. Each image wider than the content box at
+PDF_IMAGE_DPI is decoded once, downscaled and re-encoded (JPEG, or PNG when
+it has transparency). Results are cached by the hash of the original, so an
+image repeated across blocks, documents and exports is processed once. The
+stylesheet limits images to the content width, so the printed size stays
+the same.
+"""
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+from io import BytesIO
+
+from optional_deps import HAVE_PILLOW
+from page_preview import content_box
+from pdf_cache import MemoryTier
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DPI = int(os.environ.get('PDF_IMAGE_DPI', '150'))
+IMAGE_QUALITY = int(os.environ.get('PDF_IMAGE_QUALITY', '85'))
+IMAGE_CACHE_BYTES = int(os.environ.get('PDF_IMAGE_CACHE_MB', '64')) * 1024 * 1024
+
+# Raster formats only - SVG stays vector
+DATA_IMAGE_PATTERN = re.compile(r'(src=["\'])data:image/(?:png|jpeg|jpg|gif|webp|bmp);base64,([A-Za-z0-9+/=]+)(["\'])')
+
+# Cached marker for "keep the original" (small, animated or undecodable images)
+UNCHANGED = b''
+# Hash key, bytes object and dict slot of a cache entry - an UNCHANGED entry is nothing else
+ENTRY_OVERHEAD = 200
+
+
+class DataImageProcessor:
+    """Downscales data-URI images in HTML fragments, memoized by content hash"""
+
+    def __init__(self, dpi=IMAGE_DPI, quality=IMAGE_QUALITY, max_bytes=IMAGE_CACHE_BYTES):
+        # CSS pixels are 1/96 inch
+        self.max_width = int(content_box()[0] * dpi / 96)
+        self.dpi = dpi
+        self.quality = quality
+        self._cache = MemoryTier(max_bytes, ENTRY_OVERHEAD)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def settings(self):
+        """Options that change the embedded images - hashed into the renderer version.
+
+        Without Pillow images are passed through unchanged.
+        """
+        return {'enabled': HAVE_PILLOW, 'dpi': self.dpi, 'quality': self.quality}
+
+    def process(self, html_fragment):
+        """html_fragment with every oversized data-URI image replaced"""
+        if not HAVE_PILLOW or 'data:image/' not in html_fragment:
+            return html_fragment
+        return DATA_IMAGE_PATTERN.sub(self._replace, html_fragment)
+
+    def _replace(self, match):
+        payload = match.group(2)
+        key = hashlib.sha256(payload.encode('ascii')).hexdigest()
+
+        data_url = self._cache.get(key)
+        if data_url is None:
+            data_url = self._downscale(payload)
+            self._cache.put(key, data_url)
+            with self._lock:
+                self.misses += 1
+                if data_url != UNCHANGED:
+                    self.bytes_in += len(payload)
+                    self.bytes_out += len(data_url)
+        else:
+            with self._lock:
+                self.hits += 1
+
+        if data_url == UNCHANGED:
+            return match.group(0)
+        return match.group(1) + data_url.decode('ascii') + match.group(3)
+
+    def _downscale(self, payload):
+        """Smaller data URI (bytes) for one base64 image - UNCHANGED if it already fits"""
+        try:
+            from PIL import Image
+            image = Image.open(BytesIO(base64.b64decode(payload)))
+            if image.width <= self.max_width or getattr(image, 'n_frames', 1) > 1:
+                return UNCHANGED
+
+            # Width is the limit - the height bound only keeps the aspect ratio
+            image.thumbnail((self.max_width, image.height))
+            output = BytesIO()
+            if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+                image.convert('RGBA').save(output, format='PNG', optimize=True)
+                mime_type = 'image/png'
+            else:
+                image.convert('L' if image.mode in ('1', 'L') else 'RGB').save(
+                    output, format='JPEG', quality=self.quality, optimize=True
+                )
+                mime_type = 'image/jpeg'
+        except Exception as e:
+            logger.warning(f"⚠️ Embedded image left unchanged: {str(e)}")
+            return UNCHANGED
+
+        return f'data:{mime_type};base64,'.encode('ascii') + base64.b64encode(output.getvalue())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'bytes': self._cache.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'max_width_px': self.max_width,
+                'base64_bytes_in': self.bytes_in,
+                'base64_bytes_out': self.bytes_out,
+            }
@@ -0,0 +1,44 @@
+"""Job runner - renders the queued jobs of RENDER_JOBS_DIR in a process of its own.
+
+Started by render_jobs.ensure_job_runner (gunicorn's master at startup, any
+HTTP worker that finds no runner). Only one runner holds the runner lock;
+a second one exits right away. SIGTERM (gunicorn shutdown, memory budget)
+lets the running jobs finish, queued ones wait for the next runner.
+"""
+import logging
+import signal
+import sys
+
+from render_jobs import JobRunner, JobStore
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    store = JobStore()
+    # Taken before the app is imported - a runner started twice quits cheaply
+    lock = store.lock_runner()
+    if lock is None:
+        return 0
+
+    import metrics
+    from app import run_render_job
+    from browser_pool import shutdown_browser_pool
+    from memory_watchdog import start_memory_watchdog
+
+    runner = JobRunner(store, run_render_job)
+    signal.signal(signal.SIGTERM, lambda signum, frame: runner.stop())
+    start_memory_watchdog()
+    try:
+        runner.run()
+    finally:
+        shutdown_browser_pool()
+        metrics.flush()
+        lock.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
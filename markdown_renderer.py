@@ -0,0 +1,143 @@
+"""Markdown block rendering with a reusable converter and a per-block LRU cache"""
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_BUDGET = int(os.environ.get('MARKDOWN_CACHE_MB', '16')) * 1024 * 1024
+# Key, tuple and dict slot of a cache entry, on top of its strings
+ENTRY_OVERHEAD = 200
+
+# Stands in for the block number inside cached heading ids
+BLOCK_PLACEHOLDER = '\x00block\x00'
+
+HEADING_PATTERN = re.compile(r'<h([1-6])>(.*?)</h\1>')
+
+
+class MarkdownBlockRenderer:
+    """Converts Markdown blocks to HTML fragments and collects their headings.
+
+    A converter is built once per thread and reset between blocks. Results
+    are memoized by content hash with the block number left as a
+    placeholder, so a re-export where only one block changed converts only
+    that block.
+    """
+
+    def __init__(self, max_bytes=CACHE_BUDGET):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._local = threading.local()
+        self._cache = OrderedDict()  # key -> (html_template, heading_templates, duration, size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.time_spent = 0.0
+        self.time_saved = 0.0
+
+    def _converter(self):
+        converter = getattr(self._local, 'converter', None)
+        if converter is None:
+            # Imported on first use - keeps worker startup fast
+            import markdown
+            converter = markdown.Markdown(extensions=[
+                'tables',
+                'fenced_code'
+            ])
+            self._local.converter = converter
+        return converter
+
+    def _convert(self, content):
+        """Markdown -> (html_template, headings) with placeholder block numbers"""
+        converter = self._converter()
+        try:
+            html_content = converter.convert(content)
+        finally:
+            converter.reset()
+
+        headings = []
+        used_ids = set()
+
+        # Manually add IDs to headings for bookmarks (and collect them for the outline)
+        def add_heading_ids(match):
+            level = int(match.group(1))
+            inner_html = match.group(2)
+            text = re.sub(r'\s+', ' ', html.unescape(re.sub(r'<[^>]+>', '', inner_html))).strip()
+            # Generate simple ID from text
+            heading_id = re.sub(r'[^a-zA-Z0-9]', '-', text.lower()).strip('-')
+            unique_id = heading_id
+            suffix = 1
+            while unique_id in used_ids:
+                suffix += 1
+                unique_id = f'{heading_id}-{suffix}'
+            used_ids.add(unique_id)
+            if text:
+                headings.append((f'heading-{BLOCK_PLACEHOLDER}-{unique_id}', level, text))
+            return f'<h{level} id="heading-{BLOCK_PLACEHOLDER}-{unique_id}">{inner_html}</h{level}>'
+
+        # Regex for <h1>text</h1> to <h6>text</h6> - fenced code never produces these
+        html_content = HEADING_PATTERN.sub(add_heading_ids, html_content)
+        return html_content, tuple(headings)
+
+    def render(self, content, block_number):
+        """Return (html_fragment, headings) for one Markdown block.
+
+        headings is a list of (id, level, text) with level 1-6 as in Markdown.
+        """
+        key = hashlib.sha256(content.encode('utf-8')).digest()
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                self.time_saved += cached[2]
+
+        if cached is None:
+            started = time.perf_counter()
+            html_template, heading_templates = self._convert(content)
+            duration = time.perf_counter() - started
+            size = ENTRY_OVERHEAD + len(html_template) + sum(
+                len(heading_id) + len(text) for heading_id, _, text in heading_templates
+            )
+            cached = (html_template, heading_templates, duration, size)
+            with self._lock:
+                self.misses += 1
+                self.time_spent += duration
+                if size <= self.max_bytes:
+                    self._store(key, cached)
+
+        number = str(block_number)
+        html_fragment = cached[0].replace(BLOCK_PLACEHOLDER, number)
+        headings = [
+            (heading_id.replace(BLOCK_PLACEHOLDER, number), level, text)
+            for heading_id, level, text in cached[1]
+        ]
+        return html_fragment, headings
+
+    def _store(self, key, cached):
+        """Insert under self._lock, evicting least recently used entries to stay within max_bytes"""
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self.size -= old[3]
+        self._cache[key] = cached
+        self.size += cached[3]
+        while self.size > self.max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self.size -= evicted[3]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'conversion_seconds': round(self.time_spent, 4),
+                'seconds_saved': round(self.time_saved, 4),
+            }
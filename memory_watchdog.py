@@ -0,0 +1,118 @@
+"""Per-worker memory budget for the worker process and its Chromium tree.
+
+A background thread samples the resident memory of the worker and of all
+its descendants (Playwright driver, Chromium and its renderer processes)
+every MEMORY_CHECK_INTERVAL seconds. Over the browser budget, the warm
+browsers are recycled; over the worker budget, the browsers are recycled
+first and, if that was not enough, the worker is restarted gracefully -
+gunicorn finishes the current request and forks a fresh worker. A budget
+of 0 switches that check off.
+"""
+import logging
+import os
+import signal
+import threading
+import time
+
+import metrics
+from browser_pool import recycle_browser_pool
+from process_memory import process_tree_rss
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+WORKER_BUDGET = int(os.environ.get('WORKER_MEMORY_BUDGET_MB', '1024')) * MB
+BROWSER_BUDGET = int(os.environ.get('BROWSER_MEMORY_BUDGET_MB', '768')) * MB
+CHECK_INTERVAL = float(os.environ.get('MEMORY_CHECK_INTERVAL', '5'))
+
+metrics.describe('gpttopdf_memory_rss_bytes', 'gauge', 'Resident memory by process (worker, browsers)')
+metrics.describe('gpttopdf_memory_budget_bytes', 'gauge', 'Memory budget by scope (worker, browsers)')
+metrics.describe('gpttopdf_memory_browser_recycles_total', 'counter', 'Browser recycles forced by the memory budget')
+metrics.describe('gpttopdf_memory_worker_restarts_total', 'counter', 'Graceful worker restarts forced by the memory budget')
+
+
+class MemoryWatchdog:
+    """Samples this process tree and enforces the budgets"""
+
+    def __init__(self, worker_budget=WORKER_BUDGET, browser_budget=BROWSER_BUDGET, interval=CHECK_INTERVAL):
+        self.pid = os.getpid()
+        self.worker_budget = worker_budget
+        self.browser_budget = browser_budget
+        self.interval = interval
+        self.recycled = False  # browsers were recycled after the last over-budget sample
+        self.restarting = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='memory-watchdog', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self.restarting:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"⚠️ Memory check failed: {str(e)}")
+
+    def check(self):
+        """Sample once and act - returns (worker_rss, browsers_rss) in bytes"""
+        own, browsers = process_tree_rss(self.pid)
+        total = own + browsers
+        metrics.set_gauge('gpttopdf_memory_rss_bytes', own, process='worker')
+        metrics.set_gauge('gpttopdf_memory_rss_bytes', browsers, process='browsers')
+        metrics.set_gauge('gpttopdf_memory_budget_bytes', self.worker_budget, scope='worker')
+        metrics.set_gauge('gpttopdf_memory_budget_bytes', self.browser_budget, scope='browsers')
+
+        over_worker = self.worker_budget and total > self.worker_budget
+        over_browsers = self.browser_budget and browsers > self.browser_budget
+
+        if over_worker and (self.recycled or not browsers):
+            # Recycling did not help - the Python heap itself has grown
+            self.restart(own, browsers)
+        elif over_worker or over_browsers:
+            self.recycle(own, browsers)
+        else:
+            self.recycled = False
+        return own, browsers
+
+    def recycle(self, own, browsers):
+        logger.warning(
+            f"♻️ Memory budget exceeded (worker {own // MB} MB, browsers {browsers // MB} MB) - recycling browsers"
+        )
+        metrics.inc('gpttopdf_memory_browser_recycles_total')
+        recycle_browser_pool()
+        self.recycled = True
+
+    def restart(self, own, browsers):
+        logger.warning(
+            f"🔄 Worker {self.pid} over its memory budget (worker {own // MB} MB, browsers {browsers // MB} MB, "
+            f"budget {self.worker_budget // MB} MB) - restarting gracefully"
+        )
+        metrics.inc('gpttopdf_memory_worker_restarts_total')
+        metrics.flush()
+        self.restarting = True
+        # Graceful for gunicorn workers: the current request completes, the master forks a replacement
+        os.kill(self.pid, signal.SIGTERM)
+
+
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+
+def start_memory_watchdog():
+    """Start this process' watchdog (once per worker, after fork)"""
+    global _watchdog
+    if not (WORKER_BUDGET or BROWSER_BUDGET):
+        return None
+    with _watchdog_lock:
+        if _watchdog is None or _watchdog.pid != os.getpid():
+            _watchdog = MemoryWatchdog()
+            _watchdog.start()
+            logger.info(
+                f"🧮 Memory watchdog in worker {_watchdog.pid} "
+                f"(worker budget {WORKER_BUDGET // MB} MB, browsers {BROWSER_BUDGET // MB} MB)"
+            )
+        return _watchdog
@@ -0,0 +1,242 @@
+"""Prometheus-style metrics, merged across gunicorn workers.
+
+Every worker keeps its metrics in memory and periodically writes a
+snapshot to METRICS_DIR/<pid>.json. /metrics merges all snapshots:
+counters and histograms are summed over all workers that ever ran,
+gauges over the workers that are still alive.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'gpttopdf-metrics'))
+FLUSH_INTERVAL = 1.0
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help)
+METRICS = {
+    'gpttopdf_stage_duration_seconds': ('histogram', 'Duration of the PDF pipeline stages'),
+    'gpttopdf_renders_total': ('counter', 'Documents served, by source (render, cache, fallback)'),
+    'gpttopdf_output_bytes_total': ('counter', 'Bytes of rendered PDF output'),
+    'gpttopdf_output_pages_total': ('counter', 'Pages of rendered PDF output'),
+    'gpttopdf_errors_total': ('counter', 'Errors by stage'),
+}
+
+
+def describe(name, metric_type, help_text):
+    """Register a metric so /metrics renders HELP and TYPE lines for it"""
+    METRICS[name] = (metric_type, help_text)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Metric values of one process"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def set(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.gauges[key] = value
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            values = self.histograms.get(key)
+            if values is None:
+                values = self.histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, labels, value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write this process' snapshot for the other workers"""
+        self._last_flush = time.monotonic()
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, os.path.join(METRICS_DIR, f'{self.pid}.json'))
+        except OSError:
+            pass
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """This process' registry - a fresh one after fork"""
+    global _registry
+    if _registry is None or _registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = Registry()
+    return _registry
+
+
+def inc(name, value=1, **labels):
+    registry().inc(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    registry().set(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    registry().observe(name, value, **labels)
+
+
+def observe_stage(stage, seconds):
+    registry().observe('gpttopdf_stage_duration_seconds', seconds, stage=stage)
+
+
+@contextmanager
+def timer(stage):
+    """Time a pipeline stage into gpttopdf_stage_duration_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def flush():
+    registry().flush()
+
+
+def clear():
+    """Remove all worker snapshots - called once when the gunicorn master starts"""
+    if not os.path.isdir(METRICS_DIR):
+        return
+    for entry in os.scandir(METRICS_DIR):
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    parts = []
+    for key, value in items:
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render_exposition():
+    """Merge all worker snapshots into the Prometheus text exposition format"""
+    own = registry()
+    own.flush()
+
+    counters = {}
+    gauges = {}
+    histograms = {}
+    try:
+        entries = list(os.scandir(METRICS_DIR))
+    except OSError:
+        entries = []
+
+    for entry in entries:
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        if _pid_alive(snapshot['pid']):
+            for name, labels, value in snapshot['gauges']:
+                key = (name, tuple(tuple(label) for label in labels))
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = list(values)
+            else:
+                histograms[key] = [a + b for a, b in zip(merged, values)]
+
+    lines = []
+    names = sorted({key[0] for key in list(counters) + list(gauges) + list(histograms)})
+    for name in names:
+        metric_type, help_text = METRICS.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (metric, labels), value in sorted(gauges.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(BUCKETS, values):
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", repr(bound)))} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {values[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+
+    return '\n'.join(lines) + '\n'
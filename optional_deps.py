@@ -0,0 +1,8 @@
+"""Optional dependencies, checked once without importing them.
+
+Pillow: WebP preview thumbnails, pasted image downscaling, PDF image
+downsampling. Without it those steps are skipped.
+"""
+import importlib.util
+
+HAVE_PILLOW = importlib.util.find_spec('PIL') is not None
@@ -0,0 +1,145 @@
+"""Editor preview - page thumbnails and block page breaks without a PDF render.
+
+The document body is laid out on a warm page in print media at the width of
+the PDF's content box. Page breaks are estimated by cutting the layout into
+content-box-high slices; explicit CSS page breaks are not modelled. A slice
+is identified by the blocks it shows and where it starts inside the first
+of them, so a thumbnail is only re-captured when one of its blocks changed.
+"""
+import base64
+import hashlib
+import json
+import math
+import os
+import secrets
+from io import BytesIO
+
+from optional_deps import HAVE_PILLOW
+from pdf_cache import MemoryTier
+
+PREVIEW_SCALE = float(os.environ.get('PDF_PREVIEW_SCALE', '0.35'))
+PREVIEW_CACHE_BYTES = int(os.environ.get('PDF_PREVIEW_CACHE_MB', '32')) * 1024 * 1024
+PREVIEW_MAX_PAGES = int(os.environ.get('PDF_PREVIEW_MAX_PAGES', '10'))
+
+# A4 with the margins of @page in the PDF stylesheet (top, right, bottom, left), in mm
+PAGE_SIZE_MM = (210, 297)
+PAGE_MARGINS_MM = (5, 20, 20, 20)
+MM_TO_PX = 96 / 25.4
+
+FORMATS = ('png', 'webp')
+
+# Top of every block marker plus the total height, in CSS pixels - called with the marker attribute
+LAYOUT_SCRIPT = """
+attribute => ({
+    height: document.body.scrollHeight,
+    blocks: Array.from(document.querySelectorAll('[' + attribute + ']')).map(marker => ({
+        index: Number(marker.getAttribute(attribute)),
+        top: marker.getBoundingClientRect().top + window.scrollY
+    }))
+})
+"""
+
+
+def marker_attribute():
+    """Block marker attribute for one preview - user HTML cannot guess it"""
+    return f'data-block-{secrets.token_hex(8)}'
+
+
+def content_box():
+    """(width, height) of the printable area of one page in CSS pixels"""
+    top, right, bottom, left = PAGE_MARGINS_MM
+    return (
+        (PAGE_SIZE_MM[0] - left - right) * MM_TO_PX,
+        (PAGE_SIZE_MM[1] - top - bottom) * MM_TO_PX,
+    )
+
+
+def block_hash(block):
+    canonical = json.dumps(block, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def valid_markers(layout, block_count):
+    """Markers with a known block index, each block once - anything else is dropped"""
+    seen = set()
+    result = []
+    for marker in layout['blocks']:
+        index, top = marker.get('index'), marker.get('top')
+        if not all(isinstance(value, (int, float)) and math.isfinite(value) for value in (index, top)):
+            continue
+        if index != int(index) or not 0 <= index < block_count or int(index) in seen:
+            continue
+        seen.add(int(index))
+        result.append({'index': int(index), 'top': top})
+    return result
+
+
+def segments(document_data, layout):
+    """(block index or None for the title, hash, top, bottom) in layout order"""
+    blocks = document_data.get('blocks', [])
+    markers = valid_markers(layout, len(blocks))
+    result = []
+    first_top = markers[0]['top'] if markers else layout['height']
+    if first_top > 0:
+        title_hash = hashlib.sha256(document_data.get('title', '').encode('utf-8')).hexdigest()[:16]
+        result.append((None, title_hash, 0.0, first_top))
+    for position, marker in enumerate(markers):
+        bottom = markers[position + 1]['top'] if position + 1 < len(markers) else layout['height']
+        result.append((marker['index'], block_hash(blocks[marker['index']]), marker['top'], bottom))
+    return result
+
+
+def page_count(layout, page_height):
+    return max(1, int(-(-layout['height'] // page_height)))
+
+
+def block_pages(document_data, layout, page_height):
+    """First and last page (1-based) of every rendered block"""
+    result = []
+    for index, _, top, bottom in segments(document_data, layout):
+        if index is None:
+            continue
+        first = int(top // page_height) + 1
+        last = max(first, int(max(top, bottom - 1) // page_height) + 1)
+        result.append({'index': index, 'start_page': first, 'end_page': last, 'splits': last > first})
+    return result
+
+
+def page_key(document_data, layout, page_height, page, template_version, image_format):
+    """Cache key of one page thumbnail - changes only if a block on that page changed"""
+    page_top = (page - 1) * page_height
+    page_bottom = page_top + page_height
+    visible = [
+        (block, top) for _, block, top, bottom in segments(document_data, layout)
+        if bottom > page_top and top < page_bottom
+    ]
+    offset = round(page_top - visible[0][1]) if visible else 0
+    parts = [template_version, PREVIEW_SCALE, image_format, offset, [block for block, _ in visible]]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def thumbnail_format(requested):
+    """WebP needs Pillow - without it thumbnails stay PNG"""
+    return 'webp' if requested == 'webp' and HAVE_PILLOW else 'png'
+
+
+def encode_thumbnail(png_bytes, image_format):
+    """Chromium captures PNG - re-encode when another format was chosen"""
+    if image_format == 'png':
+        return png_bytes
+    from PIL import Image
+
+    output = BytesIO()
+    Image.open(BytesIO(png_bytes)).save(output, format='WEBP', quality=70)
+    return output.getvalue()
+
+
+def data_url(image_bytes, image_format):
+    return f'data:image/{image_format};base64,' + base64.b64encode(image_bytes).decode('ascii')
+
+
+class ThumbnailCache(MemoryTier):
+    """Encoded thumbnails by page key (per worker)"""
+
+    def __init__(self, max_bytes=PREVIEW_CACHE_BYTES):
+        super().__init__(max_bytes)
@@ -0,0 +1,92 @@
+"""Packaging of batch results - a ZIP of PDFs or one merged, bookmarked PDF.
+
+Every result is a dict with index, filename, title and either file (a PDF
+file object) or error (a message). Failed documents are reported in the
+ZIP's report.json; in the merged PDF they get a placeholder page.
+"""
+import json
+import zipfile
+from io import BytesIO
+
+from pdf_outline import build_outline_update, read_outline
+from simple_pdf import build_simple_pdf
+
+
+def batch_report(results):
+    """Per-document status list, in request order"""
+    report = []
+    for result in results:
+        entry = {'index': result['index'], 'title': result['title'], 'filename': result['filename']}
+        if result.get('error'):
+            entry.update(status='failed', error=result['error'])
+        else:
+            entry.update(status='done')
+        report.append(entry)
+    return report
+
+
+def unique_names(results):
+    """Numbered archive names, so equal titles cannot overwrite each other"""
+    width = len(str(len(results)))
+    return [f"{result['index'] + 1:0{width}d}_{result['filename']}" for result in results]
+
+
+def write_zip(results, output):
+    """ZIP of all rendered PDFs plus report.json"""
+    report = batch_report(results)
+    # PDFs are already compressed - storing them is as small and much faster
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for result, name, entry in zip(results, unique_names(results), report):
+            if result.get('error'):
+                continue
+            entry['archive_name'] = name
+            result['file'].seek(0)
+            with archive.open(name, 'w') as target:
+                while True:
+                    chunk = result['file'].read(64 * 1024)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+        archive.writestr('report.json', json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def write_merged_pdf(results, output):
+    """One PDF with a top-level bookmark per document (its own outline below it)"""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    entries = []
+    for result in results:
+        page_offset = len(writer.pages)
+        if result.get('error'):
+            placeholder, _ = build_simple_pdf({
+                'title': result['title'],
+                'blocks': [{'type': 'markdown', 'content': f"Dieses Dokument konnte nicht erstellt werden.\n\nFehler: {result['error']}"}]
+            })
+            reader = PdfReader(BytesIO(placeholder))
+            entries.append((1, f"{result['title']} (Fehler)", page_offset, None))
+        else:
+            result['file'].seek(0)
+            reader = PdfReader(result['file'])
+            entries.append((1, result['title'], page_offset, None))
+            outline = read_outline(reader)
+            if outline and outline[0][:2] == (1, result['title']):
+                # The document's own title entry becomes the top-level entry
+                outline = outline[1:]
+                shift = 0
+            else:
+                shift = 1
+            entries.extend(
+                (level + shift, title, page_index + page_offset, top)
+                for level, title, page_index, top in outline
+            )
+        writer.append(reader, import_outline=False)
+
+    merged = BytesIO()
+    writer.write(merged)
+    pdf_bytes = merged.getvalue()
+    output.write(pdf_bytes)
+    if entries:
+        output.write(build_outline_update(pdf_bytes, entries))
+    return batch_report(results)
@@ -0,0 +1,212 @@
+"""Content-addressed PDF result cache - in-memory LRU plus a disk tier shared by all workers"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.environ.get('PDF_CACHE_ENABLED', '1') == '1'
+MEMORY_BUDGET = int(os.environ.get('PDF_CACHE_MEMORY_MB', '64')) * 1024 * 1024
+DISK_BUDGET = int(os.environ.get('PDF_CACHE_DISK_MB', '512')) * 1024 * 1024
+CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'gpttopdf-cache'))
+
+
+def document_cache_key(document_data, renderer_version):
+    """Canonical hash of the parts of a document that affect the PDF"""
+    canonical = json.dumps(
+        {
+            'title': document_data.get('title', ''),
+            'blocks': document_data.get('blocks', []),
+            'theme': document_data.get('theme') or 'default',
+            'renderer': renderer_version,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    """LRU cache bounded by the total size of the stored values.
+
+    entry_overhead is charged on top of every value's length - for caches
+    of many small (or empty) values, whose keys and slots outweigh them.
+    """
+
+    def __init__(self, max_bytes, entry_overhead=0):
+        self.max_bytes = max_bytes
+        self.entry_overhead = entry_overhead
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if self.entry_overhead + len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= self.entry_overhead + len(old)
+            self._entries[key] = data
+            self.size += self.entry_overhead + len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self.entry_overhead + len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskTier:
+    """Directory of <key>.pdf files, evicted oldest-access-first once over budget.
+
+    Writes go through a temp file plus os.replace, so concurrent workers never
+    see partial files and a lost eviction race only costs a re-render.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # Bump mtime so eviction is LRU rather than FIFO
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._store(key, lambda f: f.write(data))
+
+    def put_file(self, key, fileobj, size):
+        """Store the contents of a file object (read from its current position)"""
+        if size > self.max_bytes:
+            return
+        self._store(key, lambda f: shutil.copyfileobj(fileobj, f))
+
+    def _store(self, key, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class PdfCache:
+    """Two-tier cache: per-worker memory LRU in front of the shared disk tier"""
+
+    def __init__(self, memory_bytes=MEMORY_BUDGET, disk_bytes=DISK_BUDGET, directory=CACHE_DIR):
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = None
+        if disk_bytes > 0:
+            try:
+                self.disk = DiskTier(directory, disk_bytes)
+            except OSError as e:
+                logger.warning(f"⚠️ PDF disk cache disabled ({directory}): {e}")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is None and self.disk is not None:
+            try:
+                data = self.disk.get(key)
+            except OSError as e:
+                logger.warning(f"⚠️ PDF disk cache read failed: {e}")
+                data = None
+            if data is not None:
+                self.memory.put(key, data)
+
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        self.memory.put(key, data)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, data)
+            except OSError as e:
+                logger.warning(f"⚠️ PDF disk cache write failed: {e}")
+
+    def put_file(self, key, fileobj, size):
+        """Cache a spooled PDF - only read into memory if it fits the memory tier"""
+        if size <= self.memory.max_bytes:
+            fileobj.seek(0)
+            self.memory.put(key, fileobj.read())
+        if self.disk is not None:
+            try:
+                fileobj.seek(0)
+                self.disk.put_file(key, fileobj, size)
+            except OSError as e:
+                logger.warning(f"⚠️ PDF disk cache write failed: {e}")
+        fileobj.seek(0)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_entries': len(self.memory),
+            'memory_bytes': self.memory.size,
+        }
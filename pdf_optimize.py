@@ -0,0 +1,222 @@
+"""Post-processing of rendered PDFs - smaller files, optionally linearized.
+
+Streams stored without a filter are Flate-compressed and identical objects
+(font programs, images and font dictionaries repeated across shards) are
+stored once. Embedded images larger than PDF_OPTIMIZE_IMAGE_MAX_PX are
+downsampled when Pillow is installed. Linearization (fast web view) needs
+the qpdf binary and runs on the finished file, after the outline update -
+any later incremental update would invalidate it.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from io import BytesIO
+
+import metrics
+from optional_deps import HAVE_PILLOW
+
+logger = logging.getLogger(__name__)
+
+# Off by default - costs CPU on every render for a few percent on typical documents
+OPTIMIZE = os.environ.get('PDF_OPTIMIZE', '0') == '1'
+IMAGE_MAX_PX = int(os.environ.get('PDF_OPTIMIZE_IMAGE_MAX_PX', '0'))
+IMAGE_QUALITY = int(os.environ.get('PDF_OPTIMIZE_IMAGE_QUALITY', '80'))
+LINEARIZE = os.environ.get('PDF_LINEARIZE', '0') == '1'
+LINEARIZE_TIMEOUT = float(os.environ.get('PDF_LINEARIZE_TIMEOUT', '30'))
+QPDF = shutil.which('qpdf')
+# Whether the optimize stage changes the output at all (?optimize=0 results are cached otherwise)
+POST_PROCESS = OPTIMIZE or (LINEARIZE and QPDF is not None)
+
+# Smaller unfiltered streams do not get shorter with Flate
+MIN_COMPRESS_BYTES = 64
+# Dictionaries that may be shared - pages, annotations and outline items have parents
+SHAREABLE_TYPES = {'/Font', '/FontDescriptor', '/ExtGState', '/XObject', '/Pattern', '/Shading'}
+
+metrics.describe('gpttopdf_optimize_bytes_total', 'counter', 'PDF bytes before and after the optimize stage')
+
+
+def settings():
+    """Effective optimize options (downsampling needs Pillow, linearization qpdf) for the cache key"""
+    return {
+        'optimize': OPTIMIZE,
+        'image_max_px': IMAGE_MAX_PX if HAVE_PILLOW else 0,
+        'image_quality': IMAGE_QUALITY,
+        'linearize': LINEARIZE and QPDF is not None,
+    }
+
+
+def _downsample_images(writer, max_px):
+    """Shrink images larger than max_px on their longer side - returns the count"""
+    from pypdf.generic import IndirectObject
+
+    done = set()
+    replaced = 0
+    for page in writer.pages:
+        resources = page.get('/Resources')
+        xobjects = resources.get_object().get('/XObject') if resources else None
+        if not xobjects:
+            continue
+        for name, reference in xobjects.get_object().items():
+            image = reference.get_object()
+            if image.get('/Subtype') != '/Image' or not isinstance(reference, IndirectObject):
+                continue
+            if reference.idnum in done or max(image.get('/Width', 0), image.get('/Height', 0)) <= max_px:
+                continue
+            done.add(reference.idnum)
+            # A replacement would lose the transparency mask
+            if '/SMask' in image or '/Mask' in image or image.get('/ImageMask'):
+                continue
+            try:
+                image_file = page.images[name]
+                picture = image_file.image
+                picture.thumbnail((max_px, max_px))
+                if picture.mode not in ('RGB', 'L'):
+                    picture = picture.convert('RGB')
+                image_file.replace(picture, quality=IMAGE_QUALITY)
+                replaced += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Image {name} not downsampled: {str(e)}")
+    return replaced
+
+
+def _compress_streams(writer):
+    """Flate-compress streams that are stored without a filter"""
+    from pypdf.generic import StreamObject
+
+    for position, obj in enumerate(writer._objects):
+        if isinstance(obj, StreamObject) and '/Filter' not in obj and len(obj._data) >= MIN_COMPRESS_BYTES:
+            writer._objects[position] = obj.flate_encode()
+
+
+def _object_key(obj):
+    """Content hash of a stream or shareable dictionary - None for anything else"""
+    from pypdf.generic import DictionaryObject, StreamObject
+
+    if isinstance(obj, StreamObject):
+        data = obj._data
+    elif isinstance(obj, DictionaryObject) and obj.get('/Type') in SHAREABLE_TYPES:
+        data = b''
+    else:
+        return None
+    output = BytesIO()
+    DictionaryObject({key: value for key, value in obj.items() if key != '/Length'}).write_to_stream(output)
+    return hashlib.sha256(output.getvalue() + b'\0' + data).digest()
+
+
+def _remap(obj, mapping, writer):
+    """Point references to duplicates at the kept object, in place"""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(obj, DictionaryObject):
+        items = obj.items()
+    elif isinstance(obj, ArrayObject):
+        items = enumerate(obj)
+    else:
+        return
+    for key, value in list(items):
+        if isinstance(value, IndirectObject):
+            if value.idnum in mapping:
+                obj[key] = IndirectObject(mapping[value.idnum], 0, writer)
+        else:
+            _remap(value, mapping, writer)
+
+
+def _dedupe_objects(writer):
+    """Store identical objects once - returns the number removed"""
+    from pypdf.generic import NullObject
+
+    removed = 0
+    # Fonts become identical only after their font programs were merged - repeat until stable
+    while True:
+        kept = {}
+        mapping = {}
+        for position, obj in enumerate(writer._objects):
+            key = _object_key(obj)
+            if key is None:
+                continue
+            if key in kept:
+                mapping[position + 1] = kept[key]
+            else:
+                kept[key] = position + 1
+        if not mapping:
+            return removed
+        for obj in writer._objects:
+            _remap(obj, mapping, writer)
+        for idnum in mapping:
+            writer._objects[idnum - 1] = NullObject()
+        removed += len(mapping)
+
+
+def optimize_pdf(pdf_bytes, image_max_px=None):
+    """Smaller rewrite of pdf_bytes - returns (pdf_bytes, report)
+
+    The input is returned unchanged when the rewrite is not smaller or fails.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    if image_max_px is None:
+        image_max_px = IMAGE_MAX_PX if HAVE_PILLOW else 0
+    report = {'bytes_before': len(pdf_bytes), 'bytes_after': len(pdf_bytes), 'deduplicated': 0, 'images': 0}
+
+    try:
+        with metrics.timer('optimize'):
+            reader = PdfReader(BytesIO(pdf_bytes))
+            writer = PdfWriter(clone_from=reader)
+            writer.pdf_header = reader.pdf_header
+            _compress_streams(writer)
+            report['deduplicated'] = _dedupe_objects(writer)
+            if image_max_px:
+                report['images'] = _downsample_images(writer, image_max_px)
+            output = BytesIO()
+            writer.write(output)
+    except Exception as e:
+        logger.warning(f"⚠️ PDF optimization failed: {str(e)}")
+        return pdf_bytes, report
+
+    optimized = output.getvalue()
+    if len(optimized) < len(pdf_bytes):
+        pdf_bytes = optimized
+        report['bytes_after'] = len(optimized)
+
+    metrics.inc('gpttopdf_optimize_bytes_total', report['bytes_before'], stage='before')
+    metrics.inc('gpttopdf_optimize_bytes_total', report['bytes_after'], stage='after')
+    logger.info(
+        f"🗜️ PDF optimized: {report['bytes_before']} -> {report['bytes_after']} bytes "
+        f"({report['deduplicated']} duplicate objects, {report['images']} images downsampled)"
+    )
+    return pdf_bytes, report
+
+
+def linearize_file(pdf_file, output):
+    """Write a linearized copy of pdf_file to output - False (nothing written) without qpdf or on error"""
+    if QPDF is None:
+        return False
+
+    with tempfile.TemporaryDirectory(prefix='gpttopdf-') as directory:
+        source = os.path.join(directory, 'input.pdf')
+        target = os.path.join(directory, 'linearized.pdf')
+        pdf_file.seek(0)
+        with open(source, 'wb') as f:
+            shutil.copyfileobj(pdf_file, f)
+
+        try:
+            with metrics.timer('linearize'):
+                result = subprocess.run(
+                    [QPDF, '--linearize', '--object-streams=generate', source, target],
+                    capture_output=True,
+                    timeout=LINEARIZE_TIMEOUT
+                )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"⚠️ PDF linearization failed: {str(e)}")
+            return False
+        # Exit code 3: written, with warnings
+        if result.returncode not in (0, 3) or not os.path.exists(target):
+            logger.warning(f"⚠️ PDF linearization failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+            return False
+
+        with open(target, 'rb') as f:
+            shutil.copyfileobj(f, output)
+    return True
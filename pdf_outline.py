@@ -0,0 +1,205 @@
+"""PDF outline (bookmarks) written as an incremental update.
+
+Instead of copying every page into a new PdfWriter, the outline objects, a
+new catalog and a small xref section are appended to the untouched
+original file. The cost depends on the number of bookmarks, not on the
+number of pages.
+"""
+import codecs
+import re
+from io import BytesIO
+
+
+def _normalize_title(text):
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+
+def read_outline(reader):
+    """(level, title, page_index, top) of every outline item in document order"""
+    result = []
+
+    def walk(outline, level):
+        for item in outline:
+            if isinstance(item, list):
+                walk(item, level + 1)
+                continue
+            try:
+                page_index = reader.get_destination_page_number(item)
+            except Exception:
+                continue
+            top = item.get('/Top')
+            # Entries written without a position carry a null /Top
+            result.append((level, item.title, page_index, float(top) if isinstance(top, (int, float)) else None))
+
+    walk(reader.outline, 1)
+    return result
+
+
+def resolve_heading_pages(pdf_bytes, headings, search_window=50):
+    """Map heading ids to (page_index, top) using the outline Chromium generated.
+
+    Chromium's outline lists the document's h1-h6 elements in order; our
+    headings are matched against it by title, in order. Returns
+    (heading_pages, page_count).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(BytesIO(pdf_bytes))
+    try:
+        rendered = [(_normalize_title(title), page_index, top) for _, title, page_index, top in read_outline(reader)]
+    except Exception:
+        rendered = []
+
+    heading_pages = {}
+    position = 0
+    for heading in headings:
+        title = _normalize_title(heading['title'])
+        for candidate in range(position, min(position + search_window, len(rendered))):
+            if rendered[candidate][0] == title:
+                _, page_index, top = rendered[candidate]
+                heading_pages[heading['id']] = (page_index, top)
+                position = candidate + 1
+                break
+    return heading_pages, len(reader.pages)
+
+
+def _startxref(pdf_bytes):
+    position = pdf_bytes.rfind(b'startxref')
+    if position == -1:
+        raise ValueError("No startxref found - not a PDF?")
+    match = re.match(rb'startxref\s+(\d+)', pdf_bytes[position:])
+    if not match:
+        raise ValueError("Malformed startxref")
+    return int(match.group(1))
+
+
+def _text_string(text):
+    """Title string - non-PDFDocEncoding text as UTF-16BE with BOM (pypdf omits the BOM)"""
+    from pypdf.generic import TextStringObject
+
+    obj = TextStringObject(text)
+    if obj.autodetect_utf16:
+        obj.utf16_bom = codecs.BOM_UTF16_BE
+    return obj
+
+
+def _serialize(obj):
+    stream = BytesIO()
+    obj.write_to_stream(stream)
+    return stream.getvalue()
+
+
+def build_outline_update(pdf_bytes, entries):
+    """Return the bytes to append to pdf_bytes so it gets the given outline.
+
+    entries is a list of (level, title, page_index, top) in document order;
+    level 1 is the top of the hierarchy. A missing level nests under the
+    closest shallower entry, like add_outline_item with parents.
+    """
+    # pypdf is imported on first use - keeps worker startup fast
+    from pypdf import PdfReader
+    from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NullObject, NumberObject
+
+    reader = PdfReader(BytesIO(pdf_bytes))
+    trailer = reader.trailer
+    root_ref = trailer.raw_get('/Root')
+    first_new = int(trailer['/Size'])
+    page_count = len(reader.pages)
+
+    # Build the tree: node = [title, page_index, top, children]
+    root = [None, None, None, []]
+    stack = [(0, root)]
+    for level, title, page_index, top in entries:
+        while stack[-1][0] >= level:
+            stack.pop()
+        node = [title, min(max(page_index, 0), page_count - 1), top, []]
+        stack[-1][1][3].append(node)
+        stack.append((level, node))
+
+    # Number all objects: outline root first, then items depth-first
+    numbered = []
+
+    def assign(node):
+        node.append(first_new + len(numbered))
+        numbered.append(node)
+        for child in node[3]:
+            assign(child)
+
+    assign(root)
+
+    def ref(node):
+        return IndirectObject(node[4], 0, reader)
+
+    def count(node):
+        return sum(1 + count(child) for child in node[3])
+
+    objects = []
+    for node in numbered:
+        children = node[3]
+        if node is root:
+            obj = DictionaryObject({NameObject('/Type'): NameObject('/Outlines')})
+        else:
+            page_ref = reader.pages[node[1]].indirect_reference
+            top = NullObject() if node[2] is None else FloatObject(node[2])
+            obj = DictionaryObject({
+                NameObject('/Title'): _text_string(node[0]),
+                NameObject('/Dest'): ArrayObject([page_ref, NameObject('/XYZ'), NullObject(), top, NullObject()]),
+            })
+        if children:
+            obj[NameObject('/First')] = ref(children[0])
+            obj[NameObject('/Last')] = ref(children[-1])
+            obj[NameObject('/Count')] = NumberObject(count(node))
+        objects.append((node[4], obj))
+
+    # Parent/sibling links
+    for parent in numbered:
+        children = parent[3]
+        for index, child in enumerate(children):
+            obj = objects[child[4] - first_new][1]
+            obj[NameObject('/Parent')] = ref(parent)
+            if index > 0:
+                obj[NameObject('/Prev')] = ref(children[index - 1])
+            if index < len(children) - 1:
+                obj[NameObject('/Next')] = ref(children[index + 1])
+
+    # New catalog revision pointing at the outline
+    catalog_source = trailer['/Root']
+    catalog = DictionaryObject({key: catalog_source.raw_get(key) for key in catalog_source})
+    catalog[NameObject('/Outlines')] = ref(root)
+    catalog[NameObject('/PageMode')] = NameObject('/UseOutlines')
+
+    # Serialize body, xref and trailer
+    base = len(pdf_bytes)
+    out = BytesIO()
+    if not pdf_bytes.endswith(b'\n'):
+        out.write(b'\n')
+
+    offsets = {}
+    for number, obj in [(root_ref.idnum, catalog)] + objects:
+        generation = root_ref.generation if number == root_ref.idnum else 0
+        offsets[number] = (base + out.tell(), generation)
+        out.write(b'%d %d obj\n' % (number, generation))
+        out.write(_serialize(obj))
+        out.write(b'\nendobj\n')
+
+    xref_offset = base + out.tell()
+    out.write(b'xref\n')
+    out.write(b'%d 1\n' % root_ref.idnum)
+    out.write(b'%010d %05d n \n' % offsets[root_ref.idnum])
+    out.write(b'%d %d\n' % (first_new, len(objects)))
+    for number, _ in objects:
+        out.write(b'%010d %05d n \n' % offsets[number])
+
+    new_trailer = DictionaryObject({
+        NameObject('/Size'): NumberObject(first_new + len(objects)),
+        NameObject('/Root'): root_ref,
+        NameObject('/Prev'): NumberObject(_startxref(pdf_bytes)),
+    })
+    for key in ('/Info', '/ID'):
+        if key in trailer:
+            new_trailer[NameObject(key)] = trailer.raw_get(key)
+
+    out.write(b'trailer\n')
+    out.write(_serialize(new_trailer))
+    out.write(b'\nstartxref\n%d\n%%%%EOF\n' % xref_offset)
+    return out.getvalue()
@@ -0,0 +1,49 @@
+"""Resident memory of a process and its children, read from /proc (Linux only)"""
+import os
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes(pid):
+    """Resident set size of one process, 0 if it is gone"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def child_pids(pid):
+    """All descendants of pid (Chromium's zygote, renderer and GPU processes included)"""
+    children = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return []
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces - the parent pid follows the closing paren
+        fields = stat[stat.rfind(')') + 2:].split()
+        if len(fields) > 1:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+
+    result = []
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            result.append(child)
+            pending.append(child)
+    return result
+
+
+def process_tree_rss(pid=None):
+    """(own RSS, summed RSS of all descendants) in bytes"""
+    pid = pid or os.getpid()
+    return rss_bytes(pid), sum(rss_bytes(child) for child in child_pids(pid))
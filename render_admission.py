@@ -0,0 +1,170 @@
+"""Host-wide admission control for Chromium renders.
+
+Every render needs one of RENDER_CONCURRENCY slots, no matter which gunicorn
+worker or job thread it runs on - one per page it renders at a time, so a
+sharded document holds a slot per shard. Requests that find all slots busy take one
+of RENDER_QUEUE_LIMIT wait tickets; without a ticket they are rejected.
+
+Slots and tickets are flock()ed files in a shared directory. The kernel drops
+the locks of a crashed worker, so a killed process never leaks a slot.
+"""
+import fcntl
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RENDER_CONCURRENCY = int(os.environ.get('RENDER_CONCURRENCY', '2'))
+RENDER_QUEUE_LIMIT = int(os.environ.get('RENDER_QUEUE_LIMIT', '8'))
+RENDER_QUEUE_TIMEOUT = float(os.environ.get('RENDER_QUEUE_TIMEOUT', '10'))
+ADMISSION_DIR = os.environ.get('RENDER_ADMISSION_DIR', os.path.join(tempfile.gettempdir(), 'gpttopdf-admission'))
+
+POLL_INTERVAL = 0.05
+RETRY_AFTER = 5
+
+metrics.describe('gpttopdf_admission_rejected_total', 'counter', 'Renders rejected by admission control, by reason')
+
+
+def _lock_path(directory, kind, index):
+    return os.path.join(directory, f'{kind}-{index}.lock')
+
+
+def try_lock(directory, kind, count):
+    """Lock the first free of count lock files of a kind - returns its fd or None"""
+    # Start at a per-process offset so workers do not all contend for file 0
+    offset = os.getpid() % count if count else 0
+    for i in range(count):
+        fd = os.open(_lock_path(directory, kind, (offset + i) % count), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return fd
+    return None
+
+
+def held_locks(directory, kind, count):
+    """Number of locked files of a kind, read from /proc/locks (Linux only)"""
+    wanted = set()
+    for i in range(count):
+        try:
+            stat = os.stat(_lock_path(directory, kind, i))
+        except OSError:
+            continue
+        wanted.add(f'{os.major(stat.st_dev):02x}:{os.minor(stat.st_dev):02x}:{stat.st_ino}')
+    if not wanted:
+        return 0
+
+    try:
+        with open('/proc/locks') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return 0
+    return sum(1 for line in lines if '->' not in line and len(line.split()) > 5 and line.split()[5] in wanted)
+
+
+class RenderQueueFull(Exception):
+    """No render slot and no room in the wait queue (or the wait timed out)"""
+
+    def __init__(self, message, queue_depth, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """Counting semaphore plus bounded wait queue, shared by all processes on the host"""
+
+    def __init__(self, directory=ADMISSION_DIR, concurrency=RENDER_CONCURRENCY,
+                 queue_limit=RENDER_QUEUE_LIMIT, queue_timeout=RENDER_QUEUE_TIMEOUT):
+        self.directory = directory
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, queue_limit)
+        self.queue_timeout = queue_timeout
+        os.makedirs(directory, exist_ok=True)
+
+    def _wait_for_slot(self, deadline):
+        while True:
+            fd = try_lock(self.directory, 'slot', self.concurrency)
+            if fd is not None:
+                return fd
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def _reject(self, reason, message):
+        metrics.inc('gpttopdf_admission_rejected_total', reason=reason)
+        logger.warning(f"🚦 Render rejected: {message}")
+        raise RenderQueueFull(message, self.waiting())
+
+    @contextmanager
+    def slot(self, block=False):
+        """Hold a render slot for the duration of the block - raises RenderQueueFull.
+
+        block=True waits without a queue ticket and without timeout (job
+        threads, whose work is already queued elsewhere).
+        """
+        requested = time.monotonic()
+        fd = try_lock(self.directory, 'slot', self.concurrency)
+        if fd is None and block:
+            fd = self._wait_for_slot(None)
+        elif fd is None:
+            ticket = try_lock(self.directory, 'queue', self.queue_limit) if self.queue_limit else None
+            if ticket is None:
+                self._reject('queue_full', f"All render slots busy and wait queue full (limit {self.queue_limit})")
+            try:
+                fd = self._wait_for_slot(requested + self.queue_timeout)
+            finally:
+                os.close(ticket)
+            if fd is None:
+                self._reject('timeout', f"No render slot free after {self.queue_timeout:g}s")
+
+        metrics.observe_stage('admission_wait', time.monotonic() - requested)
+        try:
+            yield
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def extra_slots(self, count):
+        """Hold count more render slots if they are all free right now - yields whether they were taken.
+
+        For a render that already holds a slot and wants more pages at once
+        (shards); it never waits or queues for them.
+        """
+        fds = []
+        while len(fds) < count:
+            fd = try_lock(self.directory, 'slot', self.concurrency)
+            if fd is None:
+                break
+            fds.append(fd)
+        if len(fds) < count:
+            for fd in fds:
+                os.close(fd)
+            fds = []
+        try:
+            yield len(fds) == count
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def running(self):
+        return held_locks(self.directory, 'slot', self.concurrency)
+
+    def waiting(self):
+        return held_locks(self.directory, 'queue', self.queue_limit)
+
+    def stats(self):
+        return {
+            'concurrency': self.concurrency,
+            'queue_limit': self.queue_limit,
+            'queue_timeout': self.queue_timeout,
+            'running': self.running(),
+            'waiting': self.waiting(),
+        }
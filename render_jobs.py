@@ -0,0 +1,341 @@
+"""Asynchronous render jobs - a render process of their own, fed through a queue on disk.
+
+HTTP workers only write jobs: status, payload and result are files in
+RENDER_JOBS_DIR, so every worker answers for every job and the limits are
+host-wide. A single job runner process (job_runner.py) renders them on
+browsers of its own - a request never waits for a worker's browser behind a
+job, and recycling an HTTP worker (max_requests, memory budget) loses no
+jobs. The runner holds the runner lock for its lifetime; whenever a worker
+finds it free, it starts a new runner. Queued jobs survive a runner
+restart, a job that was running when its runner died is marked failed.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.environ.get('RENDER_JOB_CONCURRENCY', os.environ.get('BROWSER_POOL_SIZE', '1')))
+JOB_QUEUE_LIMIT = int(os.environ.get('RENDER_JOB_QUEUE_LIMIT', '50'))
+JOB_LIMIT_PER_CLIENT = int(os.environ.get('RENDER_JOB_LIMIT_PER_CLIENT', '5'))
+JOB_RESULT_TTL = int(os.environ.get('RENDER_JOB_TTL', '900'))
+JOBS_DIR = os.environ.get('RENDER_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'gpttopdf-jobs'))
+
+RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_runner.py')
+
+# Highest priority first
+PRIORITIES = ('high', 'normal', 'low')
+# States in which a job still needs the runner
+OPEN_STATES = ('queued', 'running')
+
+POLL_INTERVAL = 0.2
+SWEEP_INTERVAL = 60
+# Running jobs get this long to finish when the runner is stopped
+SHUTDOWN_TIMEOUT = 20
+
+
+class JobQueueFull(Exception):
+    """The queue (or the client's share of it) has no room for another job"""
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_job_id(job_id):
+    return len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+
+def client_key(client):
+    """File-name-safe key of a client address"""
+    return hashlib.sha256(client.encode('utf-8')).hexdigest()[:16]
+
+
+def parse_entry(name):
+    """(priority rank, sequence, client key, job id) of a queue entry file name"""
+    rank, sequence, key, job_id = name[:-len('.job')].split('-')
+    return int(rank), int(sequence), key, job_id
+
+
+class JobStore:
+    """Job status, queue entries and results as files, shared by all processes"""
+
+    def __init__(self, directory=JOBS_DIR, ttl=JOB_RESULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._last_sweep = 0
+        self.queue_directory = os.path.join(directory, 'queue')
+        self.running_directory = os.path.join(directory, 'running')
+        self.lock_directory = os.path.join(directory, 'locks')
+        for path in (self.queue_directory, self.running_directory, self.lock_directory):
+            os.makedirs(path, exist_ok=True)
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def result_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.pdf')
+
+    def _write_atomic(self, path, data):
+        self._write_atomic_with(path, lambda f: f.write(data))
+
+    def _write_atomic_with(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _lock_path(self, name):
+        return os.path.join(self.lock_directory, f'{name}.lock')
+
+    def entries(self, directory):
+        return [name for name in os.listdir(directory) if name.endswith('.job')]
+
+    def queue_depth(self):
+        """Jobs waiting for the runner"""
+        return len(self.entries(self.queue_directory))
+
+    def enqueue(self, client, payload, priority='normal', **meta):
+        """Store a new job and queue it for the runner - returns its status dict, raises JobQueueFull"""
+        if priority not in PRIORITIES:
+            priority = 'normal'
+        key = client_key(client)
+        job_id = new_job_id()
+        name = f'{PRIORITIES.index(priority)}-{time.time_ns()}-{key}-{job_id}.job'
+
+        # Counting and adding under one lock - concurrent workers cannot both take the last place
+        with open(self._lock_path('submit'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            queued = self.entries(self.queue_directory)
+            if len(queued) >= JOB_QUEUE_LIMIT:
+                raise JobQueueFull(f"Render queue is full (limit {JOB_QUEUE_LIMIT} jobs)")
+            open_jobs = queued + self.entries(self.running_directory)
+            if sum(1 for entry in open_jobs if parse_entry(entry)[2] == key) >= JOB_LIMIT_PER_CLIENT:
+                raise JobQueueFull(f"Too many open jobs for this client (max {JOB_LIMIT_PER_CLIENT})")
+
+            status = self.create(job_id, priority=priority, **meta)
+            self._write_atomic(os.path.join(self.queue_directory, name), json.dumps(payload).encode('utf-8'))
+            status['queue_position'] = len(queued)
+
+        self.sweep()
+        return status
+
+    def create(self, job_id, **meta):
+        now = time.time()
+        meta.update({'job_id': job_id, 'status': 'queued', 'created': now, 'updated': now})
+        self._write_atomic(self._meta_path(job_id), json.dumps(meta).encode('utf-8'))
+        return meta
+
+    def get(self, job_id):
+        try:
+            with open(self._meta_path(job_id), 'rb') as f:
+                meta = json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - meta['updated'] > self.ttl:
+            return None
+        if meta['status'] in OPEN_STATES and not self.runner_alive():
+            # Restarted runners pick up queued jobs and fail the ones they lost
+            ensure_job_runner(self)
+        return meta
+
+    def update(self, job_id, **changes):
+        meta = self.get(job_id)
+        if meta is None:
+            return None
+        meta.update(changes)
+        meta['updated'] = time.time()
+        self._write_atomic(self._meta_path(job_id), json.dumps(meta).encode('utf-8'))
+        return meta
+
+    def save_result(self, job_id, pdf_file):
+        """Copy a PDF file object into the store"""
+        pdf_file.seek(0)
+        self._write_atomic_with(self.result_path(job_id), lambda f: shutil.copyfileobj(pdf_file, f))
+
+    def lock_runner(self):
+        """Take the runner lock for this process - returns the locked file or None if a runner is alive"""
+        lock = open(self._lock_path('runner'), 'a+')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        lock.truncate(0)
+        lock.write(str(os.getpid()))
+        lock.flush()
+        return lock
+
+    def runner_alive(self):
+        """True while a runner holds the runner lock"""
+        with open(self._lock_path('runner'), 'a+') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+        return False
+
+    def runner_pid(self):
+        try:
+            with open(self._lock_path('runner')) as f:
+                return int(f.read() or 0) or None
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def sweep(self, force=False):
+        """Delete expired jobs, their results and queue entries"""
+        now = time.time()
+        if not force and now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+
+        removed = 0
+        # Queued jobs expire too while no runner takes them - their status is gone already
+        for directory in (self.directory, self.queue_directory):
+            for entry in os.scandir(directory):
+                try:
+                    if entry.is_file() and now - entry.stat().st_mtime > self.ttl:
+                        os.unlink(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        if removed:
+            logger.info(f"🧹 Removed {removed} expired job file(s)")
+
+
+class JobRunner:
+    """Renders queued jobs on a fixed number of threads - the only consumer of the queue.
+
+    The highest priority goes first; within a priority level clients are
+    served round-robin, so one client submitting a large batch cannot
+    starve everybody else.
+    """
+
+    def __init__(self, store, handler, concurrency=JOB_CONCURRENCY):
+        self.store = store
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self._served = {}  # client key -> turn it was last served in
+        self._turn = 0
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def fail_lost_jobs(self):
+        """Jobs left in running/ by a runner that died - they will never finish"""
+        for name in self.store.entries(self.store.running_directory):
+            job_id = parse_entry(name)[3]
+            logger.warning(f"⚠️ Job {job_id} lost by a stopped job runner - marked failed")
+            self.store.update(job_id, status='failed', error='Render process exited before the job finished - please resubmit')
+            os.unlink(os.path.join(self.store.running_directory, name))
+
+    def next_entry(self):
+        """Queue entry to run next, or None"""
+        entries = [parse_entry(name) + (name,) for name in self.store.entries(self.store.queue_directory)]
+        if not entries:
+            return None
+        top = min(rank for rank, _, _, _, _ in entries)
+        # Least recently served client first, then its oldest job
+        return min(
+            (entry for entry in entries if entry[0] == top),
+            key=lambda entry: (self._served.get(entry[2], -1), entry[1])
+        )[4]
+
+    def run(self):
+        """Dispatch queued jobs until stop() - then wait for the running ones"""
+        self.fail_lost_jobs()
+        logger.info(f"📋 Job runner {os.getpid()} ready ({self.concurrency} thread(s))")
+        while not self._stopping.is_set():
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            self.store.sweep()
+            name = self.next_entry() if len(self._threads) < self.concurrency else None
+            if name is None:
+                self._stopping.wait(POLL_INTERVAL)
+                continue
+            self._turn += 1
+            self._served[parse_entry(name)[2]] = self._turn
+            os.replace(os.path.join(self.store.queue_directory, name), os.path.join(self.store.running_directory, name))
+            thread = threading.Thread(target=self._execute, args=(name,), name=f'render-job-{self._turn}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    def stop(self):
+        self._stopping.set()
+
+    def _execute(self, name):
+        job_id = parse_entry(name)[3]
+        path = os.path.join(self.store.running_directory, name)
+        started = time.time()
+        try:
+            with open(path, 'rb') as f:
+                payload = json.loads(f.read())
+            self.store.update(job_id, status='running', started=started)
+            result = self.handler(payload)
+            pdf_file = result.pop('pdf_file')
+            try:
+                self.store.save_result(job_id, pdf_file)
+            finally:
+                pdf_file.close()
+            self.store.update(job_id, status='done', duration=round(time.time() - started, 3), **result)
+            logger.info(f"✅ Job {job_id} done in {time.time() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} failed: {str(e)}")
+            try:
+                self.store.update(job_id, status='failed', error=str(e))
+            except Exception:
+                pass
+        finally:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+_runner_process = None
+_spawn_lock = threading.Lock()
+
+
+def ensure_job_runner(store):
+    """Start a job runner process unless one holds the runner lock"""
+    global _runner_process
+    with _spawn_lock:
+        if _runner_process is not None and _runner_process.poll() is None:
+            return  # started here, still taking its lock
+        if store.runner_alive():
+            return
+        logger.info("📋 Starting job runner...")
+        _runner_process = subprocess.Popen(
+            [sys.executable, RUNNER_SCRIPT],
+            cwd=os.path.dirname(RUNNER_SCRIPT),
+            start_new_session=True
+        )
+
+
+def stop_job_runner(store):
+    """Ask the running job runner to finish its jobs and exit"""
+    pid = store.runner_pid()
+    if pid is not None and store.runner_alive():
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,269 @@
+"""Browser-free PDF writer - plain text layout with the PDF base-14 fonts.
+
+Fallback renderer while Chromium is unavailable: document title, block
+titles, Markdown headings, paragraphs, lists, tables and code blocks,
+wrapped to A4. No images, no CSS - but it renders in milliseconds.
+"""
+import html
+import re
+import zlib
+
+PAGE_WIDTH = 595.28  # A4 in points
+PAGE_HEIGHT = 841.89
+MARGIN = 56.69  # 2cm, like the Chromium layout
+LINE_HEIGHT = 1.35
+
+FONTS = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold', 'F3': 'Courier'}
+
+# Helvetica advance widths (1/1000 em) for ' ' .. '~'
+HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+BOLD_FACTOR = 1.08  # Helvetica-Bold is slightly wider - close enough for line breaking
+COURIER_WIDTH = 600
+
+# (font, size, space before) per paragraph style
+STYLES = {
+    'title': ('F2', 20, 0),
+    'block_title': ('F2', 15, 18),
+    'h1': ('F2', 14, 14),
+    'h2': ('F2', 13, 12),
+    'h3': ('F2', 12, 10),
+    'h4': ('F2', 11, 8),
+    'h5': ('F2', 10.5, 8),
+    'h6': ('F2', 10.5, 8),
+    'body': ('F1', 10.5, 6),
+    'bullet': ('F1', 10.5, 2),
+    'table': ('F3', 8.5, 0),
+    'code': ('F3', 8.5, 0),
+}
+
+INLINE_MARKUP = (
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'\[([^\]]+)\]\(([^)]+)\)'), r'\1 (\2)'),
+    (re.compile(r'(\*\*|__)(.+?)\1'), r'\2'),
+    (re.compile(r'\*(.+?)\*'), r'\1'),
+    (re.compile(r'(?<!\w)_(.+?)_(?!\w)'), r'\1'),
+    (re.compile(r'~~(.+?)~~'), r'\1'),
+    (re.compile(r'`([^`]+)`'), r'\1'),
+    (re.compile(r'<[^>]+>'), ''),
+)
+HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+LIST_ITEM = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+TABLE_SEPARATOR = re.compile(r'^\s*\|?[\s:|-]+\|?\s*$')
+RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+
+
+def plain_text(text):
+    """Strip inline Markdown and HTML"""
+    for pattern, replacement in INLINE_MARKUP:
+        text = pattern.sub(replacement, text)
+    return html.unescape(text)
+
+
+def text_width(text, font, size):
+    if font == 'F3':
+        return len(text) * COURIER_WIDTH * size / 1000
+    width = sum(HELVETICA_WIDTHS[ord(c) - 32] if 32 <= ord(c) < 127 else 556 for c in text)
+    if font == 'F2':
+        width *= BOLD_FACTOR
+    return width * size / 1000
+
+
+def wrap(text, font, size, max_width):
+    """Greedy line breaking - words longer than a line are split"""
+    lines = []
+    line = ''
+    for word in text.split(' '):
+        candidate = f'{line} {word}' if line else word
+        if text_width(candidate, font, size) <= max_width:
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        while text_width(word, font, size) > max_width and len(word) > 1:
+            cut = len(word) - 1
+            while cut > 1 and text_width(word[:cut], font, size) > max_width:
+                cut -= 1
+            lines.append(word[:cut])
+            word = word[cut:]
+        line = word
+    lines.append(line)
+    return lines
+
+
+def markdown_paragraphs(content):
+    """(style, text, indent) for every paragraph of a Markdown block"""
+    in_code = False
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            yield ('body', plain_text(' '.join(paragraph)), 0)
+            paragraph.clear()
+
+    for line in content.splitlines():
+        if line.strip().startswith('```'):
+            yield from flush()
+            in_code = not in_code
+            continue
+        if in_code:
+            yield ('code', line.rstrip().expandtabs(4), 12)
+            continue
+
+        heading = HEADING.match(line)
+        item = LIST_ITEM.match(line)
+        if heading:
+            yield from flush()
+            yield (f'h{len(heading.group(1))}', plain_text(heading.group(2)), 0)
+        elif not line.strip() or RULE.match(line):
+            yield from flush()
+        elif item:
+            yield from flush()
+            indent = 12 + 6 * len(item.group(1).expandtabs(4))
+            marker = '•' if item.group(2) in '-*+' else item.group(2)
+            yield ('bullet', f'{marker} {plain_text(item.group(3))}', indent)
+        elif line.lstrip().startswith('|'):
+            yield from flush()
+            if not TABLE_SEPARATOR.match(line):
+                cells = [plain_text(cell.strip()) for cell in line.strip().strip('|').split('|')]
+                yield ('table', ' | '.join(cells), 0)
+        else:
+            paragraph.append(line.strip().lstrip('>').strip())
+    yield from flush()
+
+
+def document_paragraphs(document_data):
+    """(style, text, indent) for the whole document, in the order of the Chromium layout"""
+    title = document_data.get('title', '').strip()
+    if title:
+        yield ('title', title, 0)
+
+    for block in document_data.get('blocks', []):
+        content = block.get('content', '').strip()
+        if not content:
+            continue
+        block_title = block.get('title', '').strip()
+        if block_title:
+            yield ('block_title', block_title, 0)
+        if block.get('type') == 'code':
+            for line in content.splitlines():
+                yield ('code', line.rstrip().expandtabs(4), 12)
+        else:
+            yield from markdown_paragraphs(content)
+
+
+def _pdf_string(text):
+    """Literal string in WinAnsiEncoding (characters outside it become '?')"""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _text_string(text):
+    """Text string for metadata - UTF-16BE with byte order mark"""
+    return b'<FEFF' + text.encode('utf-16-be').hex().upper().encode('ascii') + b'>'
+
+
+def _write_pdf(pages, title):
+    """Assemble pages (lists of content stream operators) into a PDF file"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_ref = add(None)
+    font_refs = {
+        name: add(f'<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>'.encode('ascii'))
+        for name, base in FONTS.items()
+    }
+    fonts = ' '.join(f'/{name} {ref} 0 R' for name, ref in font_refs.items())
+
+    page_refs = []
+    for operators in pages:
+        stream = zlib.compress(b'\n'.join(operators))
+        content = add(f'<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n'.encode('ascii') + stream + b'\nendstream')
+        page_refs.append(add(
+            f'<< /Type /Page /Parent {pages_ref} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << {fonts} >> >> /Contents {content} 0 R >>'.encode('ascii')
+        ))
+
+    objects[catalog - 1] = f'<< /Type /Catalog /Pages {pages_ref} 0 R >>'.encode('ascii')
+    kids = ' '.join(f'{ref} 0 R' for ref in page_refs)
+    objects[pages_ref - 1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>'.encode('ascii')
+    info = add(b'<< /Title ' + _text_string(title) + b' /Producer (gpttopdf simple writer) >>')
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n'
+
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode('ascii')
+    out += (
+        f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R /Info {info} 0 R >>\n'
+        f'startxref\n{xref}\n%%EOF\n'
+    ).encode('ascii')
+    return bytes(out)
+
+
+def build_simple_pdf(document_data, notice=None):
+    """Render a document without a browser - returns (pdf_bytes, outline entries).
+
+    The outline entries are (level, title, page_index, top) like the ones
+    add_simple_bookmarks builds for Chromium output. notice is printed in
+    small type above the content.
+    """
+    width = PAGE_WIDTH - 2 * MARGIN
+    pages = [[]]
+    entries = []
+    y = PAGE_HEIGHT - MARGIN
+
+    def line(font, size, text, x):
+        nonlocal y
+        leading = size * LINE_HEIGHT
+        if y - leading < MARGIN and pages[-1]:
+            pages.append([])
+            y = PAGE_HEIGHT - MARGIN
+        y -= leading
+        if text:
+            pages[-1].append(
+                f'BT /{font} {size} Tf {x:.2f} {y + size * 0.25:.2f} Td '.encode('ascii')
+                + _pdf_string(text) + b' Tj ET'
+            )
+
+    if notice:
+        for text in wrap(notice, 'F1', 8, width):
+            line('F1', 8, text, MARGIN)
+        y -= 8
+
+    for style, text, indent in document_paragraphs(document_data):
+        font, size, space_before = STYLES[style]
+        y -= space_before if pages[-1] else 0
+        if style == 'title' or style == 'block_title' or style.startswith('h'):
+            # Keep a heading together with the first line after it
+            if y - 2.5 * size * LINE_HEIGHT < MARGIN:
+                pages.append([])
+                y = PAGE_HEIGHT - MARGIN
+            level = 1 if style == 'title' else 2 if style == 'block_title' else int(style[1]) + 2
+            entries.append((level, text, len(pages) - 1, y))
+
+        if style in ('code', 'table'):
+            # Preserve whitespace, hard-wrap at the line width
+            chars = max(1, int((width - indent) * 1000 / (COURIER_WIDTH * size)))
+            chunks = [text[i:i + chars] for i in range(0, len(text), chars)] or ['']
+        else:
+            chunks = wrap(text, font, size, width - indent)
+        for chunk in chunks:
+            line(font, size, chunk, MARGIN + indent)
+
+    return _write_pdf(pages, document_data.get('title', '') or 'Document'), entries
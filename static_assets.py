@@ -0,0 +1,104 @@
+"""Static assets and the editor page, served from memory.
+
+Every file under static/ is read once per process and gets a content-hashed
+URL (favicon.svg -> /static/favicon.<hash>.svg) that browsers may cache for
+a year as immutable - a changed file gets a new URL. Compressible files get
+prebuilt gzip and, with the brotli package, brotli variants; the smallest
+one the client accepts is sent. Each variant has its own ETag.
+"""
+import gzip
+import hashlib
+import importlib.util
+import mimetypes
+import os
+
+# brotli is optional - gzip variants only without it
+HAVE_BROTLI = importlib.util.find_spec('brotli') is not None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+URL_PREFIX = '/static/'
+HASH_LENGTH = 12
+
+# Hashed URLs never change their content
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Plain URLs (/favicon.ico, links from elsewhere) are revalidated after this
+PLAIN_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '86400'))
+
+COMPRESSIBLE_TYPES = ('application/javascript', 'application/json', 'image/svg+xml', 'image/vnd.microsoft.icon')
+# A compressed variant is only kept if it saves at least this share
+MIN_SAVING = 0.1
+
+
+def compressible(mimetype):
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+class Asset:
+    """One response body with its precompressed variants"""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants = {'identity': body}
+        if compressible(mimetype):
+            self._add('gzip', gzip.compress(body, compresslevel=9, mtime=0), body)
+            if HAVE_BROTLI:
+                import brotli
+                self._add('br', brotli.compress(body, quality=11), body)
+
+    def _add(self, encoding, data, body):
+        if len(data) <= len(body) * (1 - MIN_SAVING):
+            self.variants[encoding] = data
+
+    def etag(self, encoding):
+        return self.digest if encoding == 'identity' else f'{self.digest}-{encoding}'
+
+    def choose(self, accept_encodings):
+        """Smallest variant the client accepts (a werkzeug Accept of Accept-Encoding)"""
+        best = 'identity'
+        for encoding, data in self.variants.items():
+            if accept_encodings[encoding] > 0 and len(data) < len(self.variants[best]):
+                best = encoding
+        return best
+
+
+class StaticAssets:
+    """All files of a static directory, by plain and by hashed name"""
+
+    def __init__(self, directory=STATIC_DIR):
+        self._assets = {}
+        self._hashed_names = {}  # plain name -> hashed name
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, directory).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    asset = Asset(f.read(), mimetypes.guess_type(name)[0] or 'application/octet-stream')
+                stem, extension = os.path.splitext(name)
+                hashed_name = f'{stem}.{asset.digest[:HASH_LENGTH]}{extension}'
+                self._assets[name] = self._assets[hashed_name] = asset
+                self._hashed_names[name] = hashed_name
+
+    def url(self, name):
+        """Content-hashed URL of a static file (template global asset_url)"""
+        return URL_PREFIX + self._hashed_names.get(name, name)
+
+    def lookup(self, name):
+        """(asset, cache_control) for a plain or hashed name - (None, None) if unknown"""
+        asset = self._assets.get(name)
+        if asset is None:
+            return None, None
+        if name in self._hashed_names:
+            return asset, f'public, max-age={PLAIN_MAX_AGE}'
+        return asset, IMMUTABLE
+
+    def stats(self):
+        assets = {name: self._assets[name] for name in self._hashed_names}
+        return {
+            'files': len(assets),
+            'brotli': HAVE_BROTLI,
+            'bytes': {
+                encoding: sum(len(asset.variants.get(encoding, asset.variants['identity'])) for asset in assets.values())
+                for encoding in ('identity', 'gzip', 'br')
+            },
+        }
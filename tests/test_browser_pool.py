@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+
+from async_browser import AsyncBrowserEngine, RenderTimeout
+from browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self, options):
+        self.options = options
+        self.closed = False
+
+    def new_page(self):
+        return FakePage(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+    def is_closed(self):
+        return self.context.closed
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def is_connected(self):
+        return True
+
+    def new_context(self, **options):
+        self.contexts.append(FakeContext(options))
+        return self.contexts[-1]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool():
+    pool = BrowserPool(size=1)
+    browser = FakeBrowser()
+    pool._slots[0]._browser = browser
+    yield pool, browser
+    pool.close()
+
+
+def test_warm_page_is_reused_without_javascript(pool):
+    pool, browser = pool
+    setups = []
+    pages = [
+        pool.run(lambda page: page, warm_key='t', warm_setup=setups.append, context_options={'device_scale_factor': 2})
+        for _ in range(3)
+    ]
+    assert pages[0] is pages[1] is pages[2]
+    assert setups == [pages[0]]
+    assert browser.contexts[0].options == {'device_scale_factor': 2, 'java_script_enabled': False}
+
+
+def test_warm_page_is_dropped_after_an_error(pool):
+    pool, browser = pool
+
+    def fail(page):
+        raise RuntimeError('render failed')
+
+    first = pool.run(lambda page: page, warm_key='t', warm_setup=lambda page: None)
+    with pytest.raises(RuntimeError):
+        pool.run(fail, warm_key='t', warm_setup=lambda page: None)
+    assert first.context.closed
+    assert pool.run(lambda page: page, warm_key='t', warm_setup=lambda page: None) is not first
+
+
+def test_fresh_pages_keep_their_own_context(pool):
+    pool, browser = pool
+    first = pool.run(lambda page: page)
+    assert first.context.closed
+    assert 'java_script_enabled' not in first.context.options
+
+
+class HangingContext:
+    def __init__(self):
+        self.closed = False
+
+    async def new_page(self):
+        await asyncio.sleep(60)
+
+    async def close(self):
+        self.closed = True
+
+
+class HangingBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self, **options):
+        self.contexts.append(HangingContext())
+        return self.contexts[-1]
+
+    async def close(self):
+        pass
+
+
+def test_timed_out_acquire_closes_its_context():
+    engine = AsyncBrowserEngine(max_pages=1)
+    browser = HangingBrowser()
+    engine._browser = browser
+    engine._active[browser] = 0
+    try:
+        with pytest.raises(RenderTimeout):
+            engine.run(lambda page: page, timeout=0.2)
+        deadline = time.monotonic() + 2
+        while not browser.contexts[0].closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert browser.contexts[0].closed
+        assert engine._active[browser] == 0
+    finally:
+        engine.close()
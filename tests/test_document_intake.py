@@ -0,0 +1,17 @@
+from document_intake import validate_document
+
+
+def test_null_title_becomes_empty_string():
+    document_data = {'title': None, 'blocks': []}
+    assert validate_document(document_data) is None
+    assert document_data['title'] == ''
+
+
+def test_non_string_title_is_rejected():
+    assert validate_document({'title': 42}) == "'title' must be a string"
+
+
+def test_missing_title_is_left_alone():
+    document_data = {'blocks': [{'type': 'text', 'content': 'x'}]}
+    assert validate_document(document_data) is None
+    assert 'title' not in document_data
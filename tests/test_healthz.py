@@ -0,0 +1,32 @@
+import pytest
+
+import app
+
+
+class IdlePool:
+    def stats(self):
+        return {'warm': 1}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'get_browser_pool', IdlePool)
+    monkeypatch.setattr(app.render_breaker, 'allow', lambda: True)
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('state', ['warm', 'disabled'])
+def test_ready_after_prewarm(client, monkeypatch, state):
+    monkeypatch.setitem(app.worker_state, 'prewarm', state)
+    response = client.get('/healthz/ready')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+
+
+@pytest.mark.parametrize('state', ['pending', 'warming', 'failed'])
+def test_not_ready_until_prewarmed(client, monkeypatch, state):
+    monkeypatch.setitem(app.worker_state, 'prewarm', state)
+    response = client.get('/healthz/ready')
+    assert response.status_code == 503
+    assert response.json['prewarm'] == state
+    assert response.json['reasons']
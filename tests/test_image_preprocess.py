@@ -0,0 +1,27 @@
+import base64
+from io import BytesIO
+
+import pytest
+
+from image_preprocess import ENTRY_OVERHEAD, DataImageProcessor
+from optional_deps import HAVE_PILLOW
+
+
+def small_png(shade):
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new('RGB', (8, 8), (shade, shade, shade)).save(output, format='PNG')
+    return base64.b64encode(output.getvalue()).decode('ascii')
+
+
+@pytest.mark.skipif(not HAVE_PILLOW, reason='Pillow not installed')
+def test_unchanged_images_count_against_the_budget():
+    processor = DataImageProcessor(max_bytes=3 * ENTRY_OVERHEAD)
+    for shade in range(10):
+        html_fragment = f'<img src="data:image/png;base64,{small_png(shade)}">'
+        assert processor.process(html_fragment) == html_fragment
+
+    stats = processor.stats()
+    assert stats['entries'] == 3
+    assert stats['bytes'] == 3 * ENTRY_OVERHEAD
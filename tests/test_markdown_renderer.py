@@ -0,0 +1,25 @@
+from markdown_renderer import MarkdownBlockRenderer
+
+
+def test_cache_stays_within_byte_budget():
+    renderer = MarkdownBlockRenderer(max_bytes=4096)
+    for index in range(50):
+        renderer.render(f'# Heading {index}\n\n' + 'word ' * 100, index)
+    stats = renderer.stats()
+    assert 0 < stats['bytes'] <= 4096
+    assert stats['entries'] < 50
+
+
+def test_hit_keeps_block_numbers():
+    renderer = MarkdownBlockRenderer()
+    renderer.render('# Title', 1)
+    html_fragment, headings = renderer.render('# Title', 7)
+    assert 'id="heading-7-title"' in html_fragment
+    assert headings == [('heading-7-title', 1, 'Title')]
+    assert renderer.stats()['hits'] == 1
+
+
+def test_oversized_block_is_not_cached():
+    renderer = MarkdownBlockRenderer(max_bytes=100)
+    renderer.render('x' * 1000, 1)
+    assert renderer.stats()['entries'] == 0
@@ -0,0 +1,57 @@
+from html.parser import HTMLParser
+
+import app
+from page_preview import block_pages, marker_attribute
+
+SPOOFED_HTML = '<div data-block="99"></div><div data-block="x"></div>'
+
+
+class MarkerLayout(HTMLParser):
+    """Stands in for LAYOUT_SCRIPT - every element with the attribute, 100px apart"""
+
+    def __init__(self, attribute):
+        super().__init__()
+        self.attribute = attribute
+        self.blocks = []
+
+    def handle_starttag(self, tag, attrs):
+        value = dict(attrs).get(self.attribute)
+        if value is not None:
+            self.blocks.append({'index': float(value) if value.isdigit() else float('nan'), 'top': 100.0 * (len(self.blocks) + 1)})
+
+
+def layout_of(content_html, attribute):
+    parser = MarkerLayout(attribute)
+    parser.feed(content_html)
+    return {'height': 100.0 * (len(parser.blocks) + 1), 'blocks': parser.blocks}
+
+
+def test_block_html_cannot_spoof_markers():
+    document_data = {'title': 'Preview', 'blocks': [
+        {'type': 'markdown', 'content': 'First'},
+        {'type': 'markdown', 'content': SPOOFED_HTML},
+    ]}
+    attribute = marker_attribute()
+    content_html, _ = app.build_document_body(document_data, block_marker=attribute)
+    assert '<div data-block="99">' in content_html and '<div data-block="x">' in content_html
+
+    pages = block_pages(document_data, layout_of(content_html, attribute), page_height=1000)
+    assert [block['index'] for block in pages] == [0, 1]
+
+    # Even markers read with the spoofable attribute name do not break the layout
+    pages = block_pages(document_data, layout_of(content_html, 'data-block'), page_height=1000)
+    assert pages == []
+
+
+def test_invalid_marker_indexes_are_ignored():
+    document_data = {'blocks': [{'content': 'a'}, {'content': 'b'}]}
+    layout = {'height': 500, 'blocks': [
+        {'index': 99, 'top': 10},
+        {'index': float('nan'), 'top': 20},
+        {'index': -1, 'top': 30},
+        {'index': 1.5, 'top': 40},
+        {'index': 0, 'top': 50},
+        {'index': 0, 'top': 60},
+        {'index': 1, 'top': 70},
+    ]}
+    assert [block['index'] for block in block_pages(document_data, layout, page_height=1000)] == [0, 1]
@@ -0,0 +1,33 @@
+from io import BytesIO
+
+from pypdf import PdfWriter
+
+from pdf_outline import build_outline_update, resolve_heading_pages
+
+
+def blank_pdf(pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_null_top_keeps_the_other_headings():
+    pdf_bytes = blank_pdf(3)
+    pdf_bytes += build_outline_update(pdf_bytes, [
+        (1, 'Intro', 0, 700.0),
+        (1, 'No position', 1, None),
+        (2, 'Details', 2, 400.0),
+    ])
+    headings = [
+        {'id': 'intro', 'title': 'Intro'},
+        {'id': 'no-position', 'title': 'No  position'},
+        {'id': 'details', 'title': 'details'},
+    ]
+
+    heading_pages, page_count = resolve_heading_pages(pdf_bytes, headings)
+
+    assert page_count == 3
+    assert heading_pages == {'intro': (0, 700.0), 'no-position': (1, None), 'details': (2, 400.0)}
@@ -0,0 +1,28 @@
+import pytest
+
+from render_admission import AdmissionControl
+
+
+def test_extra_slots_all_or_none(tmp_path):
+    admission = AdmissionControl(directory=str(tmp_path), concurrency=3, queue_limit=0)
+    with admission.slot():
+        with admission.extra_slots(2) as admitted:
+            assert admitted
+            assert admission.running() == 3
+        assert admission.running() == 1
+
+        with admission.slot():
+            with admission.extra_slots(2) as admitted:
+                assert not admitted
+                assert admission.running() == 2
+
+
+def test_debug_render_needs_a_slot(tmp_path, monkeypatch):
+    import app
+
+    admission = AdmissionControl(directory=str(tmp_path), concurrency=1, queue_limit=0)
+    monkeypatch.setattr(app, 'render_admission', admission)
+    monkeypatch.setattr(app, 'create_pdf_from_html', lambda document_data: pytest.fail('rendered without a slot'))
+    with admission.slot():
+        response = app.app.test_client().get('/debug/test-pdf')
+    assert response.status_code == 429
@@ -0,0 +1,45 @@
+import pytest
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+
+import app
+from browser_pool import BrowserPoolTimeout, RenderCancelled
+from render_admission import RenderQueueFull
+
+DOCUMENT = {'title': 'Breaker', 'blocks': [{'type': 'text', 'content': 'x'}]}
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(app.render_breaker, 'failures', 0)
+    return app.render_breaker
+
+
+def render_raising(monkeypatch, error):
+    def render_pdf_document(document_data, optimize):
+        raise error
+    monkeypatch.setattr(app, 'render_pdf_document', render_pdf_document)
+    with pytest.raises(type(error)):
+        app.render_with_breaker(DOCUMENT)
+
+
+@pytest.mark.parametrize('error', [
+    PlaywrightError('BrowserType.launch: Executable doesn\'t exist at /ms-playwright/chromium'),
+    PlaywrightError('Page.pdf: Target crashed'),
+    PlaywrightError('Page.set_content: Target page, context or browser has been closed'),
+])
+def test_browser_failures_count(breaker, monkeypatch, error):
+    render_raising(monkeypatch, error)
+    assert breaker.failures == 1
+
+
+@pytest.mark.parametrize('error', [
+    PlaywrightTimeout('Page.wait_for_function: Timeout 10000ms exceeded.'),
+    PlaywrightError('Page.evaluate: ReferenceError: foo is not defined'),
+    BrowserPoolTimeout('No browser available after 30s'),
+    RenderQueueFull('Render queue full', 10),
+    RenderCancelled('Client disconnected'),
+    ValueError('Could not read PDF (pypdf)'),
+])
+def test_other_errors_are_neutral(breaker, monkeypatch, error):
+    render_raising(monkeypatch, error)
+    assert breaker.failures == 0
@@ -0,0 +1,72 @@
+import io
+import os
+import threading
+
+import pytest
+
+import render_jobs
+from render_jobs import JobQueueFull, JobRunner, JobStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # No runner processes from tests
+    monkeypatch.setattr(render_jobs, 'ensure_job_runner', lambda store: None)
+    return JobStore(directory=str(tmp_path))
+
+
+def test_limits_are_enforced(store, monkeypatch):
+    monkeypatch.setattr(render_jobs, 'JOB_LIMIT_PER_CLIENT', 2)
+    monkeypatch.setattr(render_jobs, 'JOB_QUEUE_LIMIT', 3)
+    store.enqueue('1.1.1.1', ['document', {}])
+    store.enqueue('1.1.1.1', ['document', {}])
+    with pytest.raises(JobQueueFull):
+        store.enqueue('1.1.1.1', ['document', {}])
+    status = store.enqueue('2.2.2.2', ['document', {}])
+    assert status['queue_position'] == 2
+    with pytest.raises(JobQueueFull):
+        store.enqueue('3.3.3.3', ['document', {}])
+
+
+def test_priority_then_round_robin(store):
+    runner = JobRunner(store, handler=None)
+    jobs = [store.enqueue(client, ['document', {}], priority)['job_id'] for client, priority in [
+        ('a', 'normal'), ('a', 'normal'), ('b', 'normal'), ('c', 'low'), ('d', 'high'),
+    ]]
+    order = []
+    while True:
+        name = runner.next_entry()
+        if name is None:
+            break
+        runner._turn += 1
+        runner._served[render_jobs.parse_entry(name)[2]] = runner._turn
+        os.unlink(os.path.join(store.queue_directory, name))
+        order.append(render_jobs.parse_entry(name)[3])
+    assert order == [jobs[4], jobs[0], jobs[2], jobs[1], jobs[3]]
+
+
+def test_runner_renders_queued_jobs_and_fails_lost_ones(store):
+    lost = store.enqueue('a', ['document', {}])['job_id']
+    name = store.entries(store.queue_directory)[0]
+    os.replace(os.path.join(store.queue_directory, name), os.path.join(store.running_directory, name))
+    queued = store.enqueue('a', ['document', {'title': 'x'}])['job_id']
+
+    done = threading.Event()
+
+    def handler(job):
+        assert job == ['document', {'title': 'x'}]
+        done.set()
+        return {'pdf_file': io.BytesIO(b'%PDF'), 'size': 4}
+
+    runner = JobRunner(store, handler)
+    thread = threading.Thread(target=runner.run)
+    thread.start()
+    assert done.wait(5)
+    runner.stop()
+    thread.join(5)
+
+    assert store.get(lost)['status'] == 'failed'
+    assert store.get(queued)['status'] == 'done'
+    with open(store.result_path(queued), 'rb') as f:
+        assert f.read() == b'%PDF'
+    assert store.entries(store.running_directory) == []